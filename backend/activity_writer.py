@@ -0,0 +1,119 @@
+import asyncio
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+from database import get_db_connection
+from metrics import db_query_seconds
+
+ActivityRow = Tuple  # (type, github_username, repository, issue_number, pr_number, points, category, details)
+
+INSERT_ACTIVITY = '''
+    INSERT INTO activities (type, github_username, repository, issue_number, pr_number, points, category, details)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+class ActivityWriter:
+    """Buffers activity rows and group-commits them with one executemany per flush"""
+
+    def __init__(self, batch_size: int = 100, flush_interval: float = 0.25, max_buffer: int = 10000,
+                 on_flush: Optional[Callable[[int], None]] = None):
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._max_buffer = max_buffer
+        # Called with the row count after each committed flush
+        self._on_flush = on_flush
+        self._buffer: List[ActivityRow] = []
+        self._cond = threading.Condition()
+        # Serializes flushes so batches are committed in the order they were buffered
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="activity-writer", daemon=True)
+            self._thread.start()
+
+    def _append(self, row: ActivityRow) -> bool:
+        """Buffer a row unless it needs a synchronous flush first (buffer full, or writer stopped)"""
+        with self._cond:
+            if self._stopping or len(self._buffer) >= self._max_buffer:
+                return False
+            self._buffer.append(row)
+            if len(self._buffer) == 1 or len(self._buffer) >= self._batch_size:
+                self._cond.notify()
+            return True
+
+    def write(self, row: ActivityRow):
+        """Queue one activity row; blocks on a synchronous flush when the buffer is full"""
+        if self._thread is None and not self._stopping:
+            self.start()
+        if self._append(row):
+            return
+
+        # Backpressure: the producer pays for draining the buffer instead of growing it.
+        # After stop() nothing would flush the buffer again, so late rows are written through
+        with self._cond:
+            self._buffer.append(row)
+        self.flush()
+
+    async def write_async(self, row: ActivityRow):
+        """write() for the event loop: a flush it has to wait for runs on a worker thread"""
+        if self._thread is None and not self._stopping:
+            self.start()
+        if not self._append(row):
+            await asyncio.to_thread(self.write, row)
+
+    def flush(self) -> int:
+        """Write every buffered row in a single transaction and return how many were written"""
+        with self._flush_lock:
+            with self._cond:
+                rows, self._buffer = self._buffer, []
+            if not rows:
+                return 0
+
+            started = time.perf_counter()
+            conn = get_db_connection()
+            try:
+                conn.executemany(INSERT_ACTIVITY, rows)
+                conn.commit()
+                db_query_seconds.observe(time.perf_counter() - started, "write", "activity_writer.flush")
+            except Exception as exc:
+                # Keep the rows for the next flush rather than losing them (bounded by max_buffer)
+                with self._cond:
+                    self._buffer = (rows + self._buffer)[:self._max_buffer]
+                print(f"Failed to flush {len(rows)} activities: {exc!r}")
+                return 0
+            finally:
+                conn.close()
+
+            if self._on_flush is not None:
+                self._on_flush(len(rows))
+            return len(rows)
+
+    def stop(self):
+        """Stop the background flusher and synchronously write whatever is still buffered"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._buffer and not self._stopping:
+                    self._cond.wait()
+                # Give a partial batch up to flush_interval to fill before committing it
+                if not self._stopping and len(self._buffer) < self._batch_size:
+                    self._cond.wait(timeout=self._flush_interval)
+                stopping = self._stopping
+            self.flush()
+            if stopping:
+                return
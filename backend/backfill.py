@@ -0,0 +1,374 @@
+import argparse
+import gzip
+import json
+import os
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional
+
+from dotenv import load_dotenv
+
+# Before the local imports: they read their settings from the environment on import
+load_dotenv()
+
+from database import get_db_connection, init_database
+from label_rules import label_rules
+from leaderboard_cache import replace_leaderboard
+from references import parse_closing_references
+
+BACKFILL_BATCH_SIZE = int(os.getenv("BACKFILL_BATCH_SIZE", "5000"))
+READ_CHUNK_SIZE = 1 << 20
+# Stay well below SQLite's bound-parameter limit when looking up issues by (repository, number)
+LOOKUP_CHUNK_SIZE = 400
+PROGRESS_INTERVAL = 5.0
+
+UPSERT_ISSUE = '''
+    INSERT INTO issues (issue_number, repository, title, category, points, status, labels, fetched_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, NULL)
+    ON CONFLICT(issue_number, repository) DO UPDATE SET
+        title = excluded.title, category = excluded.category, points = excluded.points,
+        status = excluded.status, labels = excluded.labels, fetched_at = NULL
+'''
+
+INSERT_PULL_REQUEST = '''
+    INSERT INTO pull_requests (pr_number, repository, github_username, issue_number, points_earned, category, merged_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+# Backfilled activities keep their historical timestamp so the feed and retention treat them as old
+INSERT_HISTORICAL_ACTIVITY = '''
+    INSERT INTO activities (type, github_username, repository, issue_number, pr_number, points, category, details, created_at)
+    VALUES ('pr_merged', ?, ?, ?, ?, ?, ?, ?, COALESCE(datetime(?), CURRENT_TIMESTAMP))
+'''
+
+UPSERT_USER_TOTALS = '''
+    INSERT INTO users (github_username, category, points, pr_count, issues_solved)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(github_username) DO UPDATE SET
+        points = points + excluded.points, pr_count = pr_count + excluded.pr_count,
+        issues_solved = issues_solved + excluded.issues_solved,
+        category = excluded.category, updated_at = CURRENT_TIMESTAMP
+'''
+
+UPSERT_DAILY_SCORES = '''
+    INSERT INTO user_daily_scores (category, day, github_username, points, pr_count, issues_solved)
+    VALUES (?, COALESCE(date(?), date('now')), ?, ?, ?, ?)
+    ON CONFLICT(category, day, github_username) DO UPDATE SET
+        points = points + excluded.points, pr_count = pr_count + excluded.pr_count,
+        issues_solved = issues_solved + excluded.issues_solved
+'''
+
+def open_export(path: Path):
+    if path.suffix == ".gz":
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+def iter_json_array(handle, decoder=json.JSONDecoder()) -> Iterator[dict]:
+    """Yield the elements of a top-level JSON array without loading the whole array"""
+    buffer = handle.read(READ_CHUNK_SIZE).lstrip()
+    if not buffer.startswith("["):
+        raise ValueError("Expected a JSON array")
+    position = 1
+    eof = False
+
+    while True:
+        # Skip whitespace and separators between elements
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+        if position < len(buffer) and buffer[position] == "]":
+            return
+        if position >= len(buffer):
+            if eof:
+                raise ValueError("Unterminated JSON array")
+            buffer = buffer[position:] + handle.read(READ_CHUNK_SIZE)
+            position = 0
+            eof = not buffer
+            continue
+
+        try:
+            element, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            # Most likely the element straddles the chunk boundary; read more and retry
+            chunk = handle.read(READ_CHUNK_SIZE)
+            if not chunk:
+                raise
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+
+        yield element
+        position = end
+        if position > READ_CHUNK_SIZE:
+            # Drop consumed text so memory stays bounded by roughly one chunk plus one element
+            buffer = buffer[position:]
+            position = 0
+
+def iter_records(path: Path) -> Iterator[dict]:
+    """Stream objects from an NDJSON file or a JSON array file (optionally gzipped)"""
+    with open_export(path) as handle:
+        first = ""
+        while not first:
+            char = handle.read(1)
+            if not char:
+                return
+            if not char.isspace():
+                first = char
+
+        if first == "[":
+            # Put the bracket back for the array parser
+            yield from iter_json_array(_Prefixed(first, handle))
+            return
+
+        line = first + handle.readline()
+        while line:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+            line = handle.readline()
+
+class _Prefixed:
+    """A text handle with some already-consumed text pushed back in front"""
+
+    def __init__(self, prefix: str, handle):
+        self._prefix = prefix
+        self._handle = handle
+
+    def read(self, size: int) -> str:
+        if self._prefix:
+            text, self._prefix = self._prefix, ""
+            return text + self._handle.read(max(size - len(text), 0))
+        return self._handle.read(size)
+
+def record_repository(record: dict, default_repo: Optional[str]) -> Optional[str]:
+    """Work out owner/repo from the shapes GitHub's REST payloads use"""
+    base_repo = (record.get("base") or {}).get("repo") or {}
+    if base_repo.get("full_name"):
+        return base_repo["full_name"]
+    repository = record.get("repository")
+    if isinstance(repository, dict) and repository.get("full_name"):
+        return repository["full_name"]
+    if isinstance(repository, str) and "/" in repository:
+        return repository
+    repository_url = record.get("repository_url")
+    if repository_url and "/repos/" in repository_url:
+        return repository_url.split("/repos/", 1)[1]
+    return default_repo
+
+def classify_record(record: dict, default_repo: Optional[str]) -> Optional[tuple]:
+    """("issue", row) or ("pull", row) for one exported object, or None if it is not importable"""
+    repository = record_repository(record, default_repo)
+    number = record.get("number")
+    if not repository or number is None:
+        return None
+
+    # The issues API lists pull requests too, flagged with a "pull_request" object
+    pull_request = record.get("pull_request")
+    if "merged_at" in record or "base" in record or isinstance(pull_request, dict):
+        merged_at = record.get("merged_at") or (pull_request or {}).get("merged_at")
+        login = (record.get("user") or {}).get("login")
+        if not merged_at or not login:
+            return None
+        return "pull", (repository, number, login, record.get("body"), merged_at)
+
+    labels = record.get("labels") or []
+    # Exports sometimes flatten labels to plain names
+    labels = [label if isinstance(label, dict) else {"name": label} for label in labels]
+    points, category = label_rules.classify(labels, repository)
+    label_names = json.dumps([label.get("name", "") for label in labels])
+    status = "closed" if record.get("state") == "closed" else "open"
+    return "issue", (number, repository, record.get("title", ""), category, points, status, label_names)
+
+def batched(iterable: Iterable, size: int) -> Iterator[List]:
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def lookup_issue_scoring(cursor, references: List[tuple]) -> dict:
+    """{(repository, number): (points, category)} for the references already in the issues table"""
+    found = {}
+    references = list(references)
+    for start in range(0, len(references), LOOKUP_CHUNK_SIZE):
+        chunk = references[start:start + LOOKUP_CHUNK_SIZE]
+        placeholders = ", ".join("(?, ?)" for _ in chunk)
+        cursor.execute(f'''
+            SELECT repository, issue_number, points, category FROM issues
+            WHERE (repository, issue_number) IN (VALUES {placeholders})
+        ''', [value for reference in chunk for value in reference])
+        for row in cursor.fetchall():
+            found[(row["repository"], row["issue_number"])] = (row["points"], row["category"])
+    return found
+
+def existing_pull_requests(cursor, keys: List[tuple]) -> set:
+    existing = set()
+    for start in range(0, len(keys), LOOKUP_CHUNK_SIZE):
+        chunk = keys[start:start + LOOKUP_CHUNK_SIZE]
+        placeholders = ", ".join("(?, ?)" for _ in chunk)
+        cursor.execute(f'''
+            SELECT repository, pr_number FROM pull_requests
+            WHERE (repository, pr_number) IN (VALUES {placeholders})
+        ''', [value for key in chunk for value in key])
+        existing.update((row["repository"], row["pr_number"]) for row in cursor.fetchall())
+    return existing
+
+def write_pulls(cursor, pulls: List[tuple], stats: dict):
+    """Score a batch of merged PRs the way handle_pr_merged does, aggregated per user and per day"""
+    # Already-imported (or live-scored) PRs are skipped, so re-running an import never double counts
+    keys = list({(repository, number) for repository, number, _, _, _ in pulls})
+    seen = existing_pull_requests(cursor, keys)
+
+    references = {}
+    for repository, number, _, body, _ in pulls:
+        references[(repository, number)] = parse_closing_references(body, repository)
+    scoring = lookup_issue_scoring(cursor, {ref for refs in references.values() for ref in refs})
+
+    pull_rows = []
+    activity_rows = []
+    user_totals = {}
+    daily = defaultdict(lambda: [0, 0, 0])
+    for repository, number, login, _, merged_at in pulls:
+        if (repository, number) in seen:
+            stats["duplicates"] += 1
+            continue
+        seen.add((repository, number))
+
+        issues = [(ref, scoring[ref]) for ref in references[(repository, number)] if ref in scoring]
+        if not issues:
+            # Same outcome as a live merge whose issues cannot be resolved
+            stats["unresolved"] += 1
+            continue
+
+        points = sum(issue_points for _, (issue_points, _) in issues)
+        category = issues[0][1][1]
+        pull_rows.append((number, repository, login, issues[0][0][1], points, category, merged_at))
+        for (issue_repo, issue_number), (issue_points, _) in issues:
+            label = f"#{issue_number}" if issue_repo == repository else f"{issue_repo}#{issue_number}"
+            activity_rows.append((login, repository, issue_number, number, issue_points, category,
+                                  f"Merged PR #{number} solving issue {label}", merged_at))
+
+        # Exports are in merge order, so the last PR seen sets the user's category
+        totals = user_totals.setdefault(login, [0, 0, 0, category])
+        totals[0] += points
+        totals[1] += 1
+        totals[2] += len(issues)
+        totals[3] = category
+        bucket = daily[(category, merged_at[:10], login)]
+        bucket[0] += points
+        bucket[1] += 1
+        bucket[2] += len(issues)
+
+    cursor.executemany(INSERT_PULL_REQUEST, pull_rows)
+    cursor.executemany(INSERT_HISTORICAL_ACTIVITY, activity_rows)
+    cursor.executemany(UPSERT_USER_TOTALS, [
+        (login, category, points, prs, issues) for login, (points, prs, issues, category) in user_totals.items()
+    ])
+    cursor.executemany(UPSERT_DAILY_SCORES, [
+        (category, day, login, points, prs, issues) for (category, day, login), (points, prs, issues) in daily.items()
+    ])
+    stats["pulls"] += len(pull_rows)
+
+def read_checkpoint(cursor, source: str, size: int) -> int:
+    cursor.execute('SELECT records, source_size FROM import_checkpoints WHERE source = ?', (source,))
+    row = cursor.fetchone()
+    if row is None:
+        return 0
+    if row["source_size"] != size:
+        print(f"{source} changed since its checkpoint; importing it from the start")
+        return 0
+    return row["records"]
+
+def save_checkpoint(cursor, source: str, size: int, records: int):
+    cursor.execute('''
+        INSERT INTO import_checkpoints (source, source_size, records, updated_at)
+        VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(source) DO UPDATE SET
+            source_size = excluded.source_size, records = excluded.records, updated_at = excluded.updated_at
+    ''', (source, size, records))
+
+def import_file(path: Path, default_repo: Optional[str] = None, batch_size: int = BACKFILL_BATCH_SIZE,
+                resume: bool = True) -> dict:
+    """Import one export file in chunked transactions, checkpointing after each chunk"""
+    source = str(path.resolve())
+    size = path.stat().st_size
+    stats = {"records": 0, "skipped": 0, "issues": 0, "pulls": 0, "duplicates": 0, "unresolved": 0}
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    done = read_checkpoint(cursor, source, size) if resume else 0
+    if done:
+        print(f"Resuming {path} after {done} records")
+
+    started = time.perf_counter()
+    last_report = started
+    position = 0
+    try:
+        for batch in batched(iter_records(path), batch_size):
+            position += len(batch)
+            if position <= done:
+                continue
+            # Only the tail of a partially checkpointed batch is new
+            batch = batch[max(done - (position - len(batch)), 0):]
+
+            issue_rows = []
+            pulls = []
+            for record in batch:
+                classified = classify_record(record, default_repo) if isinstance(record, dict) else None
+                if classified is None:
+                    stats["skipped"] += 1
+                elif classified[0] == "issue":
+                    issue_rows.append(classified[1])
+                else:
+                    pulls.append(classified[1])
+
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                # Issues first, so PRs in the same chunk can be scored from them
+                cursor.executemany(UPSERT_ISSUE, issue_rows)
+                scored = stats["pulls"]
+                if pulls:
+                    write_pulls(cursor, pulls, stats)
+                if stats["pulls"] > scored:
+                    # A running API keeps serving the snapshot, so it changes together with users
+                    replace_leaderboard(cursor)
+                save_checkpoint(cursor, source, size, position)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+            stats["issues"] += len(issue_rows)
+            stats["records"] += len(batch)
+            now = time.perf_counter()
+            if now - last_report >= PROGRESS_INTERVAL:
+                rate = stats["records"] / (now - started)
+                print(f"{path.name}: {position} records ({rate:,.0f} records/s)")
+                last_report = now
+    finally:
+        conn.close()
+
+    elapsed = time.perf_counter() - started
+    stats["seconds"] = round(elapsed, 2)
+    stats["records_per_second"] = round(stats["records"] / elapsed) if elapsed > 0 else 0
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Import historical GitHub issues and merged PRs from NDJSON or JSON array exports"
+    )
+    parser.add_argument("files", nargs="+", type=Path,
+                        help="export files (.json, .ndjson, optionally .gz); list issue exports before PR exports")
+    parser.add_argument("--repo", help="owner/repo for records that do not carry their repository")
+    parser.add_argument("--batch-size", type=int, default=BACKFILL_BATCH_SIZE)
+    parser.add_argument("--restart", action="store_true", help="ignore saved checkpoints")
+    args = parser.parse_args()
+
+    init_database()
+    label_rules.load()
+    for export in args.files:
+        print(json.dumps({"file": str(export), **import_file(export, args.repo, args.batch_size, not args.restart)}))
+    print("A running API reloads its rank index within LEADERBOARD_RELOAD_INTERVAL seconds")
@@ -0,0 +1,49 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+_MISSING = object()
+
+class TTLCache:
+    """Bounded LRU cache whose entries expire after a per-entry time-to-live"""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return a live entry (refreshing its LRU position) or `default`"""
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                return default
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Store a value, evicting the least recently used entries beyond max_size"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> bool:
+        """Evict an entry, returning whether it was present"""
+        with self._lock:
+            return self._data.pop(key, _MISSING) is not _MISSING
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
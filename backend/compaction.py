@@ -0,0 +1,180 @@
+import argparse
+import gzip
+import json
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Optional
+
+from dotenv import load_dotenv
+
+# Before the local imports: they read their settings from the environment on import
+load_dotenv()
+
+from database import DB_PATH, get_db_connection, init_database
+
+try:
+    import zstandard
+except ImportError:
+    # Optional: archives fall back to gzip without it
+    zstandard = None
+
+ACTIVITY_RETENTION_DAYS = int(os.getenv("ACTIVITY_RETENTION_DAYS", "90"))
+ACTIVITY_ARCHIVE_DIR = Path(os.getenv("ACTIVITY_ARCHIVE_DIR", Path(__file__).parent / "archive"))
+
+ARCHIVE_BATCH_SIZE = 5000
+INCREMENTAL_VACUUM_PAGES = 10000
+
+def _open_archive(archive_dir: Path, label: str):
+    """Open a compressed NDJSON archive file for writing"""
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    stamp = time.strftime("%Y%m%dT%H%M%S")
+    if zstandard is not None:
+        path = archive_dir / f"activities-before-{label}-{stamp}.ndjson.zst"
+        raw = open(path, "wb")
+        return path, raw, zstandard.ZstdCompressor(level=10).stream_writer(raw, closefd=False)
+    path = archive_dir / f"activities-before-{label}-{stamp}.ndjson.gz"
+    raw = open(path, "wb")
+    return path, raw, gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=9)
+
+def archive_activities(conn, cutoff: str, archive_dir: Path) -> tuple:
+    """Stream activities older than cutoff into a compressed archive; returns (path, rows, max id)"""
+    cursor = conn.cursor()
+    cursor.execute('SELECT * FROM activities WHERE created_at < ? ORDER BY id', (cutoff,))
+
+    path = None
+    raw = writer = None
+    archived = 0
+    max_id = 0
+    try:
+        while True:
+            rows = cursor.fetchmany(ARCHIVE_BATCH_SIZE)
+            if not rows:
+                break
+            if writer is None:
+                path, raw, writer = _open_archive(archive_dir, cutoff[:10])
+            lines = "".join(json.dumps(dict(row), separators=(",", ":")) + "\n" for row in rows)
+            writer.write(lines.encode("utf-8"))
+            archived += len(rows)
+            max_id = rows[-1]["id"]
+    finally:
+        if writer is not None:
+            writer.close()
+            # The raw rows are deleted next, so the archive must be on disk first
+            raw.flush()
+            os.fsync(raw.fileno())
+            raw.close()
+
+    return path, archived, max_id
+
+def rollup_and_delete(conn, cutoff: str, max_id: int) -> int:
+    """Fold archived activities into activity_daily and delete them, in one transaction"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute('''
+            INSERT INTO activity_daily (day, github_username, category, type, activity_count, points, pr_count)
+            SELECT date(created_at), COALESCE(github_username, ''), COALESCE(category, ''), type,
+                   COUNT(*), COALESCE(SUM(points), 0),
+                   COUNT(DISTINCT CASE WHEN pr_number IS NOT NULL THEN repository || '#' || pr_number END)
+            FROM activities
+            WHERE id <= ? AND created_at < ?
+            GROUP BY 1, 2, 3, 4
+            ON CONFLICT(day, github_username, category, type) DO UPDATE SET
+                activity_count = activity_count + excluded.activity_count,
+                points = points + excluded.points,
+                pr_count = pr_count + excluded.pr_count
+        ''', (max_id, cutoff))
+        rollup_rows = cursor.rowcount
+
+        cursor.execute('DELETE FROM activities WHERE id <= ? AND created_at < ?', (max_id, cutoff))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return rollup_rows
+
+def incremental_vacuum(pages: int = INCREMENTAL_VACUUM_PAGES) -> Optional[int]:
+    """Return free pages to the filesystem a slice at a time; returns pages freed, or None if the
+    file is not in incremental auto_vacuum mode"""
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    try:
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            # Switching modes takes a full VACUUM that rewrites and locks the whole file, so it is
+            # only ever done on request (python compaction.py --enable-incremental-vacuum)
+            return None
+        before = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        conn.execute(f'PRAGMA incremental_vacuum({int(pages)})')
+        after = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        return max(before - after, 0)
+    finally:
+        conn.close()
+
+def enable_incremental_vacuum() -> bool:
+    """Convert a file created before auto_vacuum was enabled; returns False if it already was.
+
+    Runs one full VACUUM, which rewrites the whole database and blocks every writer until it is done.
+    """
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    try:
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+            return False
+        conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        conn.execute('VACUUM')
+        return True
+    finally:
+        conn.close()
+
+def compact_activities(horizon_days: int = ACTIVITY_RETENTION_DAYS, archive_dir: Optional[Path] = None,
+                       vacuum: bool = True) -> dict:
+    """Archive, roll up and delete activities older than the horizon, then reclaim space"""
+    started = time.perf_counter()
+    archive_dir = Path(archive_dir or ACTIVITY_ARCHIVE_DIR)
+
+    conn = get_db_connection()
+    try:
+        # Cut on a day boundary so each day is rolled up by exactly one run
+        cutoff = conn.execute("SELECT datetime(date('now', ?))", (f'-{int(horizon_days)} days',)).fetchone()[0]
+        path, archived, max_id = archive_activities(conn, cutoff, archive_dir)
+        rollup_rows = rollup_and_delete(conn, cutoff, max_id) if archived else 0
+    finally:
+        conn.close()
+
+    freed_pages = 0
+    if vacuum and archived:
+        try:
+            freed_pages = incremental_vacuum()
+        except sqlite3.OperationalError as exc:
+            # Busy database: space is reclaimed on the next run
+            print(f"Incremental vacuum skipped: {exc}")
+        if freed_pages is None:
+            # Freed pages are still reused by new rows; they just stay in the file
+            print("Incremental vacuum unavailable: run python compaction.py --enable-incremental-vacuum once")
+            freed_pages = 0
+
+    return {
+        "cutoff": cutoff,
+        "archived": archived,
+        "archive_path": str(path) if path else None,
+        "rollup_rows": rollup_rows,
+        "freed_pages": freed_pages,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive and roll up old activity log rows")
+    parser.add_argument("--horizon-days", type=int, default=ACTIVITY_RETENTION_DAYS,
+                        help="keep raw activities newer than this many days")
+    parser.add_argument("--archive-dir", type=Path, default=ACTIVITY_ARCHIVE_DIR)
+    parser.add_argument("--no-vacuum", action="store_true", help="skip the incremental vacuum step")
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="first convert an older database file to incremental auto_vacuum "
+                             "(one full VACUUM that locks the database while it runs)")
+    args = parser.parse_args()
+
+    init_database()
+    if args.enable_incremental_vacuum:
+        print("Converted to incremental auto_vacuum" if enable_incremental_vacuum()
+              else "Incremental auto_vacuum already enabled")
+    print(json.dumps(compact_activities(args.horizon_days, args.archive_dir, not args.no_vacuum), indent=2))
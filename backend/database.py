@@ -1,14 +1,120 @@
 import sqlite3
 from pathlib import Path
 import os
+import queue
+
+DB_PATH = Path(__file__).parent / "leaderboard.db"
+
+# Connection tuning (overridable through the environment)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "256"))
+
+def _connect() -> sqlite3.Connection:
+    """Open a tuned connection to the leaderboard database"""
+    conn = sqlite3.connect(
+        DB_PATH,
+        timeout=DB_BUSY_TIMEOUT_MS / 1000,
+        check_same_thread=False,
+        cached_statements=DB_STATEMENT_CACHE_SIZE,
+    )
+    conn.row_factory = sqlite3.Row
+    
+    # WAL lets readers proceed while a writer commits; NORMAL is durable under WAL
+    # except for the last transactions on power loss, which is fine for a scoreboard
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA mmap_size={DB_MMAP_SIZE}')
+    conn.execute(f'PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    return conn
+
+class PooledConnection:
+    """Proxy for a pooled sqlite3 connection whose close() hands it back to the pool"""
+
+    def __init__(self, pool: "ConnectionPool", conn: sqlite3.Connection):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self._conn.__enter__()
+
+    def __exit__(self, *exc_info):
+        return self._conn.__exit__(*exc_info)
+
+    def close(self):
+        if self._conn is not None:
+            self._pool.release(self._conn)
+            self._conn = None
+
+class ConnectionPool:
+    """Keeps up to `size` idle connections so requests skip connect/close and keep their statement cache"""
+
+    def __init__(self, size: int):
+        # LIFO hands out the most recently used connection, whose caches are warmest
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def acquire(self) -> PooledConnection:
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = _connect()
+        return PooledConnection(self, conn)
+
+    def release(self, conn: sqlite3.Connection):
+        # Never hand out a connection with a half-finished transaction
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+_pool = ConnectionPool(DB_POOL_SIZE)
+
+def get_db_connection() -> PooledConnection:
+    """Borrow a connection from the pool; close() returns it"""
+    return _pool.acquire()
+
+def close_db_pool():
+    """Close every idle pooled connection"""
+    _pool.close_all()
+
+def add_missing_columns(cursor, table: str, columns: dict):
+    """Add columns that an older database file does not have yet"""
+    cursor.execute(f'PRAGMA table_info({table})')
+    existing = {row[1] for row in cursor.fetchall()}
+    for name, definition in columns.items():
+        if name not in existing:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {name} {definition}')
 
 def init_database():
     """Initialize SQLite database with required tables"""
-    db_path = Path(__file__).parent / "leaderboard.db"
+    db_path = DB_PATH
     
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
     
+    # Only takes effect on a new file; older files are converted explicitly
+    # (python compaction.py --enable-incremental-vacuum)
+    cursor.execute('PRAGMA auto_vacuum=INCREMENTAL')
+    
+    # WAL is persistent, so set it once when the database is created
+    cursor.execute('PRAGMA journal_mode=WAL')
+    
     # Users table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS users (
@@ -36,11 +142,21 @@ def init_database():
             points INTEGER NOT NULL,
             status TEXT DEFAULT 'open',
             assignee TEXT,
+            labels TEXT,
+            etag TEXT,
+            fetched_at TIMESTAMP,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             UNIQUE(issue_number, repository)
         )
     ''')
     
+    # Columns added after the first release
+    add_missing_columns(cursor, 'issues', {
+        'labels': 'TEXT',
+        'etag': 'TEXT',
+        'fetched_at': 'TIMESTAMP',
+    })
+    
     # Pull requests table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS pull_requests (
@@ -73,23 +189,211 @@ def init_database():
         )
     ''')
     
-    # Leaderboard cache table
+    # Daily per-user/per-category rollups of compacted activities ('' stands in for NULL keys)
     cursor.execute('''
-        CREATE TABLE IF NOT EXISTS leaderboard_cache (
+        CREATE TABLE IF NOT EXISTS activity_daily (
+            day TEXT NOT NULL,
+            github_username TEXT NOT NULL DEFAULT '',
+            category TEXT NOT NULL DEFAULT '',
+            type TEXT NOT NULL,
+            activity_count INTEGER NOT NULL DEFAULT 0,
+            points INTEGER NOT NULL DEFAULT 0,
+            pr_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, github_username, category, type)
+        )
+    ''')
+    
+    # Points earned per user per day in each category, for time-windowed leaderboards
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_daily_scores (
+            category TEXT NOT NULL,
+            day TEXT NOT NULL,
+            github_username TEXT NOT NULL,
+            points INTEGER NOT NULL DEFAULT 0,
+            pr_count INTEGER NOT NULL DEFAULT 0,
+            issues_solved INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (category, day, github_username)
+        ) WITHOUT ROWID
+    ''')
+    
+    # Seed the buckets from already-scored pull requests the first time the table is created
+    cursor.execute('SELECT EXISTS(SELECT 1 FROM user_daily_scores)')
+    if not cursor.fetchone()[0]:
+        cursor.execute('''
+            INSERT INTO user_daily_scores (category, day, github_username, points, pr_count, issues_solved)
+            SELECT category, COALESCE(date(merged_at), date(created_at)), github_username,
+                   SUM(points_earned), COUNT(*), COUNT(*)
+            FROM pull_requests
+            GROUP BY 1, 2, 3
+        ''')
+    
+    # Totals granted at registration rather than earned through merged PRs; rebuild.py adds them
+    # back on top of the pr_merged log. Older files keep, as base, whatever the log does not explain
+    cursor.execute('PRAGMA table_info(users)')
+    if 'base_points' not in {row[1] for row in cursor.fetchall()}:
+        add_missing_columns(cursor, 'users', {
+            'base_points': 'INTEGER NOT NULL DEFAULT 0',
+            'base_pr_count': 'INTEGER NOT NULL DEFAULT 0',
+            'base_issues_solved': 'INTEGER NOT NULL DEFAULT 0',
+        })
+        cursor.execute('''
+            UPDATE users SET base_points = COALESCE(points, 0), base_pr_count = COALESCE(pr_count, 0),
+                base_issues_solved = COALESCE(issues_solved, 0)
+        ''')
+        cursor.execute('''
+            UPDATE users SET base_points = MAX(base_points - logged.points, 0),
+                base_pr_count = MAX(base_pr_count - logged.pr_count, 0),
+                base_issues_solved = MAX(base_issues_solved - logged.issues_solved, 0)
+            FROM (
+                SELECT github_username, SUM(points) AS points, SUM(pr_count) AS pr_count,
+                       SUM(issues_solved) AS issues_solved
+                FROM (
+                    SELECT github_username, COALESCE(SUM(points), 0) AS points,
+                           COUNT(DISTINCT repository || '#' || pr_number) AS pr_count, COUNT(*) AS issues_solved
+                    FROM activities
+                    WHERE type = 'pr_merged'
+                    GROUP BY github_username
+                    UNION ALL
+                    SELECT github_username, SUM(points), SUM(pr_count), SUM(activity_count)
+                    FROM activity_daily
+                    WHERE type = 'pr_merged'
+                    GROUP BY github_username
+                )
+                GROUP BY github_username
+            ) AS logged
+            WHERE logged.github_username = users.github_username
+        ''')
+
+    # Raw webhook deliveries awaiting background processing
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS webhook_queue (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
+            delivery_id TEXT,
+            event_type TEXT,
+            payload BLOB NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER DEFAULT 0,
+            last_error TEXT,
+            received_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            processed_at TIMESTAMP,
+            retry_at TIMESTAMP
+        )
+    ''')
+    
+    # Progress of offline imports (backfill.py), one row per source file
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS import_checkpoints (
+            source TEXT PRIMARY KEY,
+            source_size INTEGER,
+            records INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Ranked snapshot of the top positions of each category, one row per position.
+    # Derived data rebuilt on startup, so the older one-JSON-blob-per-category layout is simply dropped
+    cursor.execute('PRAGMA table_info(leaderboard_cache)')
+    if 'data' in {row[1] for row in cursor.fetchall()}:
+        cursor.execute('DROP TABLE leaderboard_cache')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS leaderboard_cache (
             category TEXT NOT NULL,
-            data TEXT NOT NULL,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            UNIQUE(category)
+            rank INTEGER NOT NULL,
+            github_username TEXT NOT NULL,
+            full_name TEXT,
+            points INTEGER NOT NULL,
+            pr_count INTEGER NOT NULL,
+            issues_solved INTEGER NOT NULL,
+            PRIMARY KEY (category, rank)
+        ) WITHOUT ROWID
+    ''')
+    
+    # Bumped by offline tools (backfill, rebuild) that change users behind a running API,
+    # which polls it to reload the rank index it keeps in memory
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS leaderboard_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            generation INTEGER NOT NULL DEFAULT 0
         )
     ''')
+    cursor.execute('INSERT OR IGNORE INTO leaderboard_state (id) VALUES (1)')
+    
+    # Full-text index over usernames and display names for /api/v1/users/search.
+    # External content: the text lives only in users, triggers keep the index in step.
+    # Prefix indexes up to 6 characters keep typeahead cheap even when thousands of
+    # usernames share a prefix; an index built with other settings is rebuilt
+    cursor.execute("SELECT sql FROM sqlite_master WHERE name = 'users_fts'")
+    row = cursor.fetchone()
+    fts_exists = row is not None and "prefix='1 2 3 4 5 6'" in row[0]
+    try:
+        if row is not None and not fts_exists:
+            cursor.execute('DROP TABLE users_fts')
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5(
+                github_username, full_name,
+                content='users', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2', prefix='1 2 3 4 5 6'
+            )
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS users_fts_insert AFTER INSERT ON users BEGIN
+                INSERT INTO users_fts (rowid, github_username, full_name)
+                VALUES (new.id, new.github_username, new.full_name);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS users_fts_delete AFTER DELETE ON users BEGIN
+                INSERT INTO users_fts (users_fts, rowid, github_username, full_name)
+                VALUES ('delete', old.id, old.github_username, old.full_name);
+            END
+        ''')
+        # Score updates touch users constantly; only name changes need reindexing
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS users_fts_update AFTER UPDATE OF github_username, full_name ON users BEGIN
+                INSERT INTO users_fts (users_fts, rowid, github_username, full_name)
+                VALUES ('delete', old.id, old.github_username, old.full_name);
+                INSERT INTO users_fts (rowid, github_username, full_name)
+                VALUES (new.id, new.github_username, new.full_name);
+            END
+        ''')
+        if not fts_exists:
+            cursor.execute("INSERT INTO users_fts (users_fts) VALUES ('rebuild')")
+    except sqlite3.OperationalError as exc:
+        # SQLite built without FTS5: everything but user search keeps working
+        print(f"User search disabled: {exc}")
     
     # Create indexes for better performance
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_category ON users(category)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_points ON users(points)')
+    # Ranked walk of a category: matches the leaderboard ORDER BY and covers its columns
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_users_category_rank
+        ON users(category, points DESC, pr_count DESC, github_username, full_name, issues_solved)
+    ''')
+    # Superseded by the composite index above (it has the same leading column)
+    cursor.execute('DROP INDEX IF EXISTS idx_users_category')
+    # Ranked walk across categories (search over a common prefix); also serves points > 0 scans
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_users_rank ON users(points DESC, pr_count DESC, github_username)
+    ''')
+    # Superseded by idx_users_rank (same leading column)
+    cursor.execute('DROP INDEX IF EXISTS idx_users_points')
+    # Case-insensitive username prefix probes for /api/v1/users/search (LIKE 'prefix%' uses it)
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_username_nocase ON users(github_username COLLATE NOCASE)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_issues_category ON issues(category)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_activities_type ON activities(type)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_activities_created_at ON activities(created_at)')
+    # Filtered activity feeds: every index ends in (created_at, rowid) so a page is a range scan
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_activities_user_created ON activities(github_username, created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_activities_type_created ON activities(type, created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_activities_repo_created ON activities(repository, created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_activities_category_created ON activities(category, created_at)')
+    # Superseded by idx_activities_type_created
+    cursor.execute('DROP INDEX IF EXISTS idx_activities_type')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_webhook_queue_status ON webhook_queue(status, id)')
+    # Redelivered webhooks carry the same X-GitHub-Delivery id
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_webhook_queue_delivery
+        ON webhook_queue(delivery_id) WHERE delivery_id IS NOT NULL
+    ''')
     
     conn.commit()
     conn.close()
@@ -0,0 +1,122 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, List, Optional
+
+from database import _connect
+from metrics import db_query_seconds, db_queue_seconds, sql_name
+
+# Reader threads per worker; each keeps one connection for its whole life
+DB_READER_THREADS = int(os.getenv("DB_READER_THREADS", "8"))
+
+def work_name(fn: Callable) -> str:
+    """Metric label for a unit of db work, e.g. 'build_leaderboard_cache.rebuild' for a nested function"""
+    return getattr(fn, "__qualname__", type(fn).__name__).replace(".<locals>", "")
+
+class AsyncDatabase:
+    """Runs SQLite work off the event loop: a pool of reader threads and one serialized writer thread.
+
+    Every thread owns a single connection, so callables receive that connection as their first
+    argument and never share it. Writes queue up on the writer instead of contending for the
+    SQLite write lock, and reads scale with the reader pool while a write is in progress.
+    """
+
+    def __init__(self, readers: int = DB_READER_THREADS):
+        self._readers = readers
+        self._reader_pool: Optional[ThreadPoolExecutor] = None
+        self._writer_pool: Optional[ThreadPoolExecutor] = None
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    def _executors(self):
+        # Created lazily so importing the module has no side effects
+        with self._lock:
+            if self._reader_pool is None:
+                self._reader_pool = ThreadPoolExecutor(max_workers=self._readers, thread_name_prefix="db-reader")
+                self._writer_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+            return self._reader_pool, self._writer_pool
+
+    def _connection(self, read_only: bool) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = _connect()
+            if read_only:
+                # Readers must never take the write lock, even by accident
+                conn.execute('PRAGMA query_only=ON')
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _run_read(self, name: str, submitted: float, fn: Callable, args, kwargs):
+        started = time.perf_counter()
+        db_queue_seconds.observe(started - submitted, "read")
+        conn = self._connection(read_only=True)
+        try:
+            return fn(conn, *args, **kwargs)
+        finally:
+            # End the read transaction so the WAL can be checkpointed past it
+            if conn.in_transaction:
+                conn.rollback()
+            db_query_seconds.observe(time.perf_counter() - started, "read", name)
+
+    def _run_write(self, name: str, submitted: float, fn: Callable, args, kwargs):
+        started = time.perf_counter()
+        db_queue_seconds.observe(started - submitted, "write")
+        conn = self._connection(read_only=False)
+        try:
+            result = fn(conn, *args, **kwargs)
+            if conn.in_transaction:
+                conn.commit()
+            return result
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            db_query_seconds.observe(time.perf_counter() - started, "write", name)
+
+    async def _submit(self, write: bool, name: str, fn: Callable, args, kwargs) -> Any:
+        reader_pool, writer_pool = self._executors()
+        pool, run = (writer_pool, self._run_write) if write else (reader_pool, self._run_read)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(pool, partial(run, name, time.perf_counter(), fn, args, kwargs))
+
+    async def read(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run fn(conn, *args) on a reader thread"""
+        return await self._submit(False, work_name(fn), fn, args, kwargs)
+
+    async def write(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run fn(conn, *args) on the writer thread; commits on success, rolls back on error"""
+        return await self._submit(True, work_name(fn), fn, args, kwargs)
+
+    async def fetch_one(self, sql: str, params=()) -> Optional[sqlite3.Row]:
+        return await self._submit(False, sql_name(sql), lambda conn: conn.execute(sql, params).fetchone(), (), {})
+
+    async def fetch_all(self, sql: str, params=()) -> List[sqlite3.Row]:
+        return await self._submit(False, sql_name(sql), lambda conn: conn.execute(sql, params).fetchall(), (), {})
+
+    async def execute(self, sql: str, params=()) -> int:
+        """Run one write statement and return its rowcount"""
+        return await self._submit(True, sql_name(sql), lambda conn: conn.execute(sql, params).rowcount, (), {})
+
+    def close(self):
+        """Wait for queued work, then close every thread's connection"""
+        with self._lock:
+            reader_pool, writer_pool = self._reader_pool, self._writer_pool
+            self._reader_pool = self._writer_pool = None
+        for pool in (writer_pool, reader_pool):
+            if pool is not None:
+                pool.shutdown(wait=True)
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+db = AsyncDatabase()
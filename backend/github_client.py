@@ -0,0 +1,110 @@
+import asyncio
+import os
+import random
+import time
+from typing import Optional
+
+import httpx
+
+from metrics import github_endpoint, github_rate_limit_remaining, github_request_seconds
+
+# Client tuning (overridable through the environment)
+GITHUB_TIMEOUT = float(os.getenv("GITHUB_TIMEOUT", "10"))
+GITHUB_CONNECT_TIMEOUT = float(os.getenv("GITHUB_CONNECT_TIMEOUT", "5"))
+GITHUB_MAX_RETRIES = int(os.getenv("GITHUB_MAX_RETRIES", "3"))
+GITHUB_MAX_CONNECTIONS = int(os.getenv("GITHUB_MAX_CONNECTIONS", "20"))
+
+RETRY_BACKOFF_BASE = 0.5
+RETRY_BACKOFF_MAX = 8.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+GRAPHQL_URL = "https://api.github.com/graphql"
+
+class GitHubClient:
+    """Shared async HTTP client for GitHub with keep-alive connections and retry with backoff"""
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # Created lazily so it binds to the running event loop
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(GITHUB_TIMEOUT, connect=GITHUB_CONNECT_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=GITHUB_MAX_CONNECTIONS,
+                    max_keepalive_connections=GITHUB_MAX_CONNECTIONS,
+                    keepalive_expiry=60,
+                ),
+                headers={"User-Agent": "leadership-board-api"},
+            )
+        return self._client
+
+    def _retry_delay(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return min(float(retry_after), RETRY_BACKOFF_MAX)
+        delay = min(RETRY_BACKOFF_BASE * (2 ** attempt), RETRY_BACKOFF_MAX)
+        return delay + random.uniform(0, delay / 2)
+
+    @staticmethod
+    def _record_rate_limit(response: httpx.Response):
+        remaining = response.headers.get("X-RateLimit-Remaining")
+        if remaining is not None and remaining.isdigit():
+            # Search, GraphQL and core calls are limited separately
+            github_rate_limit_remaining.set(int(remaining), response.headers.get("X-RateLimit-Resource", "core"))
+
+    async def request(self, method: str, url: str, retries: Optional[int] = None,
+                      idempotent: Optional[bool] = None, **kwargs) -> httpx.Response:
+        """Send a request, retrying transient failures with exponential backoff"""
+        method = method.upper()
+        retries = GITHUB_MAX_RETRIES if retries is None else retries
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        client = self._get_client()
+        endpoint = github_endpoint(url)
+
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, url, **kwargs)
+            except httpx.TransportError as exc:
+                github_request_seconds.observe(time.perf_counter() - started, method, endpoint, "error")
+                # Only connect errors are safe to retry for non-idempotent requests
+                retryable = idempotent or isinstance(exc, httpx.ConnectError)
+                if not retryable or attempt >= retries:
+                    raise
+                await asyncio.sleep(self._retry_delay(attempt, None))
+                attempt += 1
+                continue
+
+            github_request_seconds.observe(time.perf_counter() - started, method, endpoint, str(response.status_code))
+            self._record_rate_limit(response)
+
+            if response.status_code in RETRY_STATUSES and idempotent and attempt < retries:
+                await asyncio.sleep(self._retry_delay(attempt, response))
+                attempt += 1
+                continue
+
+            return response
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def graphql(self, query: str, variables: Optional[dict] = None, **kwargs) -> httpx.Response:
+        """Run a GraphQL query; queries are read-only, so they are retried like GETs"""
+        return await self.request("POST", GRAPHQL_URL, idempotent=True,
+                                  json={"query": query, "variables": variables or {}}, **kwargs)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+github = GitHubClient()
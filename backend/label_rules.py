@@ -0,0 +1,152 @@
+import json
+import os
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+LABEL_RULES_PATH = Path(os.getenv("LABEL_RULES_PATH", Path(__file__).parent / "label_rules.json"))
+LABEL_RULES_CACHE_SIZE = int(os.getenv("LABEL_RULES_CACHE_SIZE", "4096"))
+
+# Used when no rules file exists; mirrors the shipped label_rules.json
+DEFAULT_RULES = {
+    "default_points": 5,
+    "default_category": "fullstack",
+    "points": [
+        {"keywords": ["point"], "extract_number": True},
+        {"keywords": ["easy"], "points": 5},
+        {"keywords": ["medium"], "points": 10},
+        {"keywords": ["hard"], "points": 15},
+        {"keywords": ["expert"], "points": 25}
+    ],
+    "categories": [
+        {"category": "aiml", "keywords": ["ai", "ml", "machine-learning", "artificial-intelligence",
+                                          "data-science", "neural-network", "tensorflow", "pytorch",
+                                          "nlp", "computer-vision", "deep-learning", "aiml"]},
+        {"category": "fullstack", "keywords": ["frontend", "backend", "fullstack", "full-stack",
+                                               "react", "node", "api", "database", "web-dev",
+                                               "javascript", "typescript"]}
+    ],
+    "repositories": {}
+}
+
+NUMBER = re.compile(r'\d+')
+
+def compile_priority(keyword_groups: List[List[str]]) -> Optional["re.Pattern"]:
+    """One regex that reports the first group (in priority order) with a keyword anywhere in the text.
+
+    Each alternative is an anchored lookahead wrapping one capture group, so the alternation is
+    tried in rule order and `match.lastindex - 1` is the index of the winning rule.
+    """
+    if not keyword_groups:
+        return None
+    alternatives = []
+    for keywords in keyword_groups:
+        escaped = sorted({re.escape(keyword.lower()) for keyword in keywords})
+        alternatives.append("(?=.*?(" + "|".join(escaped) + "))")
+    return re.compile("^(?:" + "|".join(alternatives) + ")", re.DOTALL)
+
+class RuleSet:
+    """A compiled label scheme: point rules, category rules and defaults"""
+
+    def __init__(self, config: dict):
+        self.default_points = int(config.get("default_points", 5))
+        self.default_category = config.get("default_category", "fullstack")
+
+        self.point_rules: List[dict] = []
+        for rule in config.get("points", []):
+            if not rule.get("keywords"):
+                raise ValueError("Every point rule needs at least one keyword")
+            if not rule.get("extract_number") and "points" not in rule:
+                raise ValueError(f"Point rule {rule['keywords']} needs 'points' or 'extract_number'")
+            self.point_rules.append(rule)
+
+        self.category_rules: List[dict] = []
+        for rule in config.get("categories", []):
+            if not rule.get("category") or not rule.get("keywords"):
+                raise ValueError("Every category rule needs a category and at least one keyword")
+            self.category_rules.append(rule)
+
+        self._points_pattern = compile_priority([rule["keywords"] for rule in self.point_rules])
+        self._category_pattern = compile_priority([rule["keywords"] for rule in self.category_rules])
+        # Keyed by the normalized label tuple; a reload builds a new RuleSet and so a fresh cache
+        self.classify = lru_cache(maxsize=LABEL_RULES_CACHE_SIZE)(self._classify)
+
+    def _label_points(self, label: str) -> int:
+        match = self._points_pattern.match(label) if self._points_pattern else None
+        if match is None:
+            return 0
+        rule = self.point_rules[match.lastindex - 1]
+        if rule.get("extract_number"):
+            # e.g. "5-points", "points-10": the first number in the label
+            number = NUMBER.search(label)
+            return int(number.group()) if number else 0
+        return int(rule["points"])
+
+    def _label_category(self, label: str) -> Optional[str]:
+        match = self._category_pattern.match(label) if self._category_pattern else None
+        if match is None:
+            return None
+        return self.category_rules[match.lastindex - 1]["category"]
+
+    def _classify(self, labels: Tuple[str, ...]) -> Tuple[int, str]:
+        """(points, category) for a tuple of lower-cased label names"""
+        points = sum(self._label_points(label) for label in labels)
+
+        # The first label that names a category decides it
+        category = self.default_category
+        for label in labels:
+            matched = self._label_category(label)
+            if matched:
+                category = matched
+                break
+
+        return (points if points > 0 else self.default_points), category
+
+class LabelRules:
+    """Default rules plus per-repository overrides, swapped as a whole on reload"""
+
+    def __init__(self, path: Path = LABEL_RULES_PATH):
+        self.path = Path(path)
+        self._rules: Tuple[RuleSet, Dict[str, RuleSet]] = self._compile(DEFAULT_RULES)
+
+    @staticmethod
+    def _compile(config: dict) -> Tuple[RuleSet, Dict[str, RuleSet]]:
+        base = {key: value for key, value in config.items() if key != "repositories"}
+        default = RuleSet(base)
+        overrides = {}
+        for repository, override in (config.get("repositories") or {}).items():
+            # Overrides replace whole sections of the default scheme
+            overrides[repository.lower()] = RuleSet({**base, **override})
+        return default, overrides
+
+    def load(self) -> dict:
+        """Read and compile the rules file, then swap it in; the old rules stay live on any error"""
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as rules_file:
+                config = json.load(rules_file)
+        else:
+            print(f"Label rules file {self.path} not found, using built-in rules")
+            config = DEFAULT_RULES
+
+        compiled = self._compile(config)
+        # A single reference assignment, so concurrent classifications see either the old or the new rules
+        self._rules = compiled
+        return self.summary()
+
+    def summary(self) -> dict:
+        default, overrides = self._rules
+        return {
+            "path": str(self.path),
+            "point_rules": len(default.point_rules),
+            "category_rules": len(default.category_rules),
+            "repositories": sorted(overrides)
+        }
+
+    def classify(self, labels: List[dict], repository: Optional[str] = None) -> Tuple[int, str]:
+        """(points, category) for a list of GitHub label objects"""
+        default, overrides = self._rules
+        rules = overrides.get(repository.lower(), default) if repository else default
+        return rules.classify(tuple(label.get("name", "").lower() for label in labels))
+
+label_rules = LabelRules()
@@ -0,0 +1,54 @@
+import os
+from typing import List, Optional
+
+CATEGORIES = ["fullstack", "aiml"]
+
+MAX_PAGE_SIZE = 200
+
+# Top positions per category kept in leaderboard_cache; deeper pages walk idx_users_category_rank
+LEADERBOARD_SNAPSHOT_SIZE = max(int(os.getenv("LEADERBOARD_SNAPSHOT_SIZE", "500")), MAX_PAGE_SIZE)
+
+def refresh_leaderboard_cache(cursor, category: str, first_rank: int, last_rank: Optional[int] = None):
+    """Rewrite snapshot positions first_rank..last_rank (default: to the end of the snapshot) from users"""
+    # Runs on the caller's cursor so the snapshot commits together with the users change
+    last_rank = min(last_rank or LEADERBOARD_SNAPSHOT_SIZE, LEADERBOARD_SNAPSHOT_SIZE)
+    if category not in CATEGORIES or first_rank > last_rank:
+        return
+
+    # A walk of idx_users_category_rank that never goes deeper than the snapshot
+    cursor.execute('''
+        SELECT github_username, full_name, points, pr_count, issues_solved
+        FROM users
+        WHERE category = ? AND points > 0
+        ORDER BY points DESC, pr_count DESC, github_username
+        LIMIT ? OFFSET ?
+    ''', (category, last_rank - first_rank + 1, first_rank - 1))
+    rows = cursor.fetchall()
+
+    cursor.executemany('''
+        INSERT OR REPLACE INTO leaderboard_cache
+            (category, rank, github_username, full_name, points, pr_count, issues_solved)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', [(category, first_rank + offset, *row) for offset, row in enumerate(rows)])
+
+    if first_rank + len(rows) <= last_rank:
+        # The category ends inside the range, so any positions past its end are stale
+        cursor.execute('DELETE FROM leaderboard_cache WHERE category = ? AND rank >= ?',
+                       (category, first_rank + len(rows)))
+
+def rebuild_leaderboard_cache(cursor, categories: List[str] = CATEGORIES):
+    """Rebuild the whole snapshot of the given categories"""
+    for category in categories:
+        cursor.execute('DELETE FROM leaderboard_cache WHERE category = ?', (category,))
+        refresh_leaderboard_cache(cursor, category, 1)
+
+def leaderboard_generation(conn) -> int:
+    return conn.execute('SELECT generation FROM leaderboard_state WHERE id = 1').fetchone()[0]
+
+def replace_leaderboard(cursor):
+    """Rebuild every snapshot after users changed outside the API, inside the caller's transaction.
+
+    Also bumps the generation, which a running API polls to reload its rank index.
+    """
+    rebuild_leaderboard_cache(cursor)
+    cursor.execute('UPDATE leaderboard_state SET generation = generation + 1 WHERE id = 1')
@@ -0,0 +1,90 @@
+import asyncio
+import threading
+from typing import Dict, List, Optional, Set
+
+class Subscriber:
+    """One streaming client: pending updates coalesced per user, bounded for backpressure"""
+
+    def __init__(self, category: Optional[str], max_pending: int):
+        self.category = category
+        self._max_pending = max_pending
+        self._pending: Dict[str, dict] = {}
+        self._resync = False
+        self._ready = asyncio.Event()
+
+    def wants(self, update: dict) -> bool:
+        if self.category is None:
+            return True
+        return self.category in (update.get("category"), update.get("previous_category"))
+
+    def push(self, update: dict):
+        username = update["github_username"]
+        if username not in self._pending and len(self._pending) >= self._max_pending:
+            # The client is too far behind for diffs to be worth it; send it a fresh snapshot instead
+            self._pending.clear()
+            self._resync = True
+        elif not self._resync:
+            # Updates carry absolute totals, so only the latest one per user matters
+            self._pending[username] = update
+        self._ready.set()
+
+    async def next_frame(self, timeout: float, coalesce: float):
+        """Wait for the next frame: ("snapshot", None), ("diff", updates) or None on timeout"""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+        # Let a burst of writes land so they go out as one frame
+        if coalesce > 0:
+            await asyncio.sleep(coalesce)
+
+        self._ready.clear()
+        if self._resync:
+            self._resync = False
+            self._pending.clear()
+            return "snapshot", None
+
+        updates: List[dict] = list(self._pending.values())
+        self._pending.clear()
+        return "diff", updates
+
+class LeaderboardBroadcaster:
+    """Fans leaderboard updates out from the single writer to every streaming client"""
+
+    def __init__(self, max_pending: int = 500):
+        self._max_pending = max_pending
+        self._subscribers: Set[Subscriber] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        """Attach to the event loop that owns the subscribers"""
+        self._loop = loop
+        self._loop_thread = threading.get_ident()
+
+    def subscribe(self, category: Optional[str] = None) -> Subscriber:
+        subscriber = Subscriber(category, self._max_pending)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self._subscribers.discard(subscriber)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, update: dict):
+        """Queue an update for every interested subscriber; safe to call from any thread"""
+        if self._loop is None or not self._subscribers:
+            return
+        if threading.get_ident() == self._loop_thread:
+            self._fanout(update)
+        else:
+            self._loop.call_soon_threadsafe(self._fanout, update)
+
+    def _fanout(self, update: dict):
+        for subscriber in list(self._subscribers):
+            if subscriber.wants(update):
+                subscriber.push(update)
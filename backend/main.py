@@ -1,28 +1,52 @@
 import os
+import asyncio
 import sqlite3
 import json
-from fastapi import FastAPI, HTTPException, Request, Depends, Header
+import re
+import time
+from fastapi import FastAPI, HTTPException, Request, Depends, Header, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import RedirectResponse
+from fastapi.responses import Response, RedirectResponse, JSONResponse, StreamingResponse
 import uvicorn
 from typing import Optional, List
 import hmac
 import hashlib
-import requests
-from datetime import datetime
-from pydantic import BaseModel
+import httpx
+from datetime import date, datetime, timedelta
+from pydantic import BaseModel, Field
 from dotenv import load_dotenv
-from pathlib import Path
-from database import init_database
-import urllib.parse
 
-# Load environment variables
+# Load environment variables before the local modules below read their settings on import
 load_dotenv()
 
+from database import init_database, close_db_pool
+from db_async import db
+from rank_index import RankIndex
+from github_client import github
+from cache import TTLCache
+from live import LeaderboardBroadcaster
+from versions import VersionRegistry
+from response_cache import ResponseCache, encoded, strip_coding
+from compaction import compact_activities
+from rebuild import rebuild_user_totals
+from label_rules import label_rules
+from leaderboard_cache import (CATEGORIES, LEADERBOARD_SNAPSHOT_SIZE, MAX_PAGE_SIZE, leaderboard_generation,
+                               rebuild_leaderboard_cache, refresh_leaderboard_cache)
+from references import parse_closing_references
+from activity_writer import ActivityWriter, INSERT_ACTIVITY
+from webhook_queue import WebhookWorkers, enqueue_delivery, queue_stats
+from metrics import MetricsMiddleware, registry as metrics_registry, webhook_event_seconds
+import urllib.parse
+import base64
+from email.utils import formatdate, parsedate_to_datetime
+
 # Initialize database
 init_database()
 
+# Issue scoring rules (LABEL_RULES_PATH); reloadable through the admin API
+label_rules.load()
+
 app = FastAPI(title="Leadership Board API", version="1.0.0")
 
 # CORS middleware
@@ -34,16 +58,52 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Added last so it is outermost and times everything, including CORS preflights
+app.add_middleware(MetricsMiddleware)
+
 # Security
 security = HTTPBearer()
 
-# Database connection
-DB_PATH = Path(__file__).parent / "leaderboard.db"
+def require_admin(x_admin_token: str = Header(None)):
+    """Guard maintenance endpoints with the ADMIN_TOKEN shared secret"""
+    admin_token = os.getenv("ADMIN_TOKEN")
+    if not admin_token:
+        raise HTTPException(status_code=503, detail="Admin API not configured")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
 
-def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+# Change counters behind ETag / Last-Modified; bumped only after the write commits.
+# Scopes: "leaderboard:<category>", "user:<github_username>", "activities"
+versions = VersionRegistry()
+
+def not_modified_response(request: Request, etag: str, last_modified: float) -> Optional[Response]:
+    """Return a 304 if the client's validators still match, otherwise None"""
+    headers = conditional_headers(etag, last_modified)
+    
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [strip_coding(tag.strip()) for tag in if_none_match.split(",")]
+        if etag in tags or "*" in tags:
+            return Response(status_code=304, headers=headers)
+        return None
+    
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return None
+        if int(last_modified) <= since:
+            return Response(status_code=304, headers=headers)
+    return None
+
+def conditional_headers(etag: str, last_modified: float) -> dict:
+    return {
+        "ETag": etag,
+        "Last-Modified": formatdate(last_modified, usegmt=True),
+        # Clients may store the body but must revalidate, which is now a cheap 304
+        "Cache-Control": "no-cache"
+    }
 
 # Pydantic models
 class User(BaseModel):
@@ -55,6 +115,12 @@ class User(BaseModel):
     pr_count: int = 0
     issues_solved: int = 0
 
+# Upper bound on names per POST /api/v1/users/batch request
+USER_BATCH_MAX = int(os.getenv("USER_BATCH_MAX", "500"))
+
+class UserBatchRequest(BaseModel):
+    usernames: List[str] = Field(..., min_length=1, max_length=USER_BATCH_MAX)
+
 class WebhookPayload(BaseModel):
     action: str
     pull_request: Optional[dict] = None
@@ -84,107 +150,271 @@ def verify_github_signature(payload_body: bytes, signature_header: str, secret:
     
     return hmac.compare_digest(expected_signature, signature_header)
 
-def extract_points_from_labels(labels: List[dict]) -> int:
+def extract_points_from_labels(labels: List[dict], repository: Optional[str] = None) -> int:
     """Extract points from issue labels"""
-    points = 0
-    for label in labels:
-        label_name = label.get('name', '').lower()
-        # Look for point labels like "5-points", "points-10", "easy-3", etc.
-        if 'point' in label_name:
-            # Extract numbers from the label
-            import re
-            numbers = re.findall(r'\d+', label_name)
-            if numbers:
-                points += int(numbers[0])
-        elif 'easy' in label_name:
-            points += 5
-        elif 'medium' in label_name:
-            points += 10
-        elif 'hard' in label_name:
-            points += 15
-        elif 'expert' in label_name:
-            points += 25
-    
-    return points if points > 0 else 5  # Default 5 points if no specific points found
-
-def determine_category_from_labels(labels: List[dict]) -> str:
+    return label_rules.classify(labels, repository)[0]
+
+def determine_category_from_labels(labels: List[dict], repository: Optional[str] = None) -> str:
     """Determine if issue is for fullstack or AI/ML based on labels"""
-    label_names = [label.get('name', '').lower() for label in labels]
-    
-    # AI/ML keywords
-    aiml_keywords = ['ai', 'ml', 'machine-learning', 'artificial-intelligence', 
-                     'data-science', 'neural-network', 'tensorflow', 'pytorch', 
-                     'nlp', 'computer-vision', 'deep-learning', 'aiml']
-    
-    # Full Stack keywords
-    fullstack_keywords = ['frontend', 'backend', 'fullstack', 'full-stack', 
-                         'react', 'node', 'api', 'database', 'web-dev', 'javascript', 'typescript']
-    
-    for label in label_names:
-        if any(keyword in label for keyword in aiml_keywords):
-            return 'aiml'
-        if any(keyword in label for keyword in fullstack_keywords):
-            return 'fullstack'
-    
-    # Default to fullstack if no specific category found
-    return 'fullstack'
-
-def log_activity(activity_type: str, github_username: str = None, repository: str = None, 
-                issue_number: int = None, pr_number: int = None, points: int = None, 
-                category: str = None, details: str = None):
-    """Log activity to database"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    return label_rules.classify(labels, repository)[1]
+
+# Activity rows are group-committed: every ACTIVITY_BATCH_SIZE rows or ACTIVITY_FLUSH_MS milliseconds
+activity_writer = ActivityWriter(
+    batch_size=int(os.getenv("ACTIVITY_BATCH_SIZE", "100")),
+    flush_interval=int(os.getenv("ACTIVITY_FLUSH_MS", "250")) / 1000,
+    max_buffer=int(os.getenv("ACTIVITY_BUFFER_SIZE", "10000")),
+    on_flush=lambda count: versions.bump("activities")
+)
+
+async def log_activity(activity_type: str, github_username: str = None, repository: str = None, 
+                       issue_number: int = None, pr_number: int = None, points: int = None, 
+                       category: str = None, details: str = None):
+    """Log activity to database (buffered, see activity_writer); never flushes on the event loop"""
+    await activity_writer.write_async((activity_type, github_username, repository, issue_number, pr_number,
+                                       points, category, details))
+
+# In-process rank structure, kept in sync with users.points by the write paths
+rank_index = RankIndex(CATEGORIES)
+
+# Pushes committed score changes to /api/v1/leaderboard/stream clients
+broadcaster = LeaderboardBroadcaster(max_pending=int(os.getenv("LIVE_MAX_PENDING", "500")))
+
+def place_in_leaderboard_cache(cursor, previous: Optional[dict], totals: dict):
+    """Rewrite only the snapshot positions that a user's new totals shift"""
+    category = totals["category"]
+    # The rank index still holds the committed state, so it knows the old and the new position
+    rank = rank_index.position(totals["github_username"], category, totals["points"], totals["pr_count"])
+    
+    if previous and previous["category"] == category and rank is not None:
+        # Moving within a category only shifts the users between the two positions
+        refresh_leaderboard_cache(cursor, category, min(rank, previous["rank"]), max(rank, previous["rank"]))
+        return
+    
+    if previous:
+        # Leaving a category moves everyone below up one place
+        refresh_leaderboard_cache(cursor, previous["category"], previous["rank"])
+    if rank is not None:
+        # Entering one moves everyone below down one place
+        refresh_leaderboard_cache(cursor, category, rank)
+
+def encode_token(position: list) -> str:
+    """Encode a keyset position as an opaque, URL-safe cursor token"""
+    raw = json.dumps(position, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_token(cursor_token: str, types: tuple) -> list:
+    """Decode a cursor token, checking it holds one value of each expected type"""
+    try:
+        padded = cursor_token + "=" * (-len(cursor_token) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded))
+        if not (isinstance(position, list) and len(position) == len(types)
+                and all(isinstance(value, kind) for value, kind in zip(position, types))):
+            raise ValueError("Malformed cursor")
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return position
+
+def encode_cursor(entry: dict) -> str:
+    """Encode the position after a leaderboard entry as an opaque cursor token"""
+    return encode_token([entry["points"], entry["pr_count"], entry["github_username"], entry["rank"]])
+
+def decode_cursor(cursor_token: str) -> tuple:
+    """Decode a cursor token into (points, pr_count, github_username, rank)"""
+    return tuple(decode_token(cursor_token, (int, int, str, int)))
+
+def get_leaderboard_page(cursor, category: str, limit: int, after: Optional[tuple]) -> tuple:
+    """Fetch one page of a category leaderboard by walking idx_users_category_rank"""
+    if after is None:
+        cursor.execute('''
+            SELECT github_username, full_name, category, points, pr_count, issues_solved
+            FROM users
+            WHERE category = ? AND points > 0
+            ORDER BY points DESC, pr_count DESC, github_username
+            LIMIT ?
+        ''', (category, limit + 1))
+        last_rank = 0
+    else:
+        points, pr_count, github_username, last_rank = after
+        # The redundant "points <= ?" bound turns the seek into an index range scan
+        cursor.execute('''
+            SELECT github_username, full_name, category, points, pr_count, issues_solved
+            FROM users
+            WHERE category = ? AND points > 0 AND points <= ?
+              AND (points < ? OR (points = ? AND (pr_count < ? OR (pr_count = ? AND github_username > ?))))
+            ORDER BY points DESC, pr_count DESC, github_username
+            LIMIT ?
+        ''', (category, points, points, points, pr_count, pr_count, github_username, limit + 1))
+    
+    rows = cursor.fetchall()
+    page = []
+    for offset, row in enumerate(rows[:limit]):
+        entry = dict(row)
+        # Ranks continue from the cursor, so no window function is needed
+        entry["rank"] = last_rank + offset + 1
+        page.append(entry)
+    
+    next_cursor = encode_cursor(page[-1]) if len(rows) > limit else None
+    return page, next_cursor
+
+def get_cached_leaderboard(cursor, category: str, limit: int = LEADERBOARD_SNAPSHOT_SIZE) -> tuple:
+    """Read the top of a category from the ranked snapshot, with the cursor that continues past it"""
+    cursor.execute('''
+        SELECT github_username, full_name, category, points, pr_count, issues_solved, rank
+        FROM leaderboard_cache
+        WHERE category = ?
+        ORDER BY rank
+        LIMIT ?
+    ''', (category, limit + 1))
+    rows = [dict(row) for row in cursor.fetchall()]
     
+    leaderboard = rows[:limit]
+    # A full snapshot may continue in users; later pages go through get_leaderboard_page
+    more = len(rows) > limit or len(rows) == LEADERBOARD_SNAPSHOT_SIZE
+    return leaderboard, (encode_cursor(leaderboard[-1]) if more and leaderboard else None)
+
+def apply_user_points(cursor, github_username: str, points: int, category: str, issues: int = 1,
+                      scored_at: Optional[str] = None) -> dict:
+    """Upsert a user's totals and daily bucket inside the caller's transaction and return the new totals"""
+    cursor.execute('''
+        INSERT INTO users (github_username, category, points, pr_count, issues_solved)
+        VALUES (?, ?, ?, 1, ?)
+        ON CONFLICT(github_username) DO UPDATE SET
+            points = points + excluded.points, pr_count = pr_count + 1,
+            issues_solved = issues_solved + excluded.issues_solved,
+            category = excluded.category, updated_at = CURRENT_TIMESTAMP
+        RETURNING github_username, category, points, pr_count, issues_solved
+    ''', (github_username, category, points, issues))
+    totals = dict(cursor.fetchone())
+    
+    # Windowed leaderboards sum these buckets instead of scanning the activity log
     cursor.execute('''
-        INSERT INTO activities (type, github_username, repository, issue_number, pr_number, points, category, details)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (activity_type, github_username, repository, issue_number, pr_number, points, category, details))
+        INSERT INTO user_daily_scores (category, day, github_username, points, pr_count, issues_solved)
+        VALUES (?, COALESCE(date(?), date('now')), ?, ?, 1, ?)
+        ON CONFLICT(category, day, github_username) DO UPDATE SET
+            points = points + excluded.points, pr_count = pr_count + 1,
+            issues_solved = issues_solved + excluded.issues_solved
+    ''', (category, scored_at, github_username, points, issues))
+    
+    # Ranked users sit in the rank index, so it also tells us which positions they are leaving
+    place_in_leaderboard_cache(cursor, rank_index.rank(github_username), totals)
+    return totals
+
+def publish_user_points(totals: dict, previous: Optional[dict]) -> dict:
+    """Apply committed totals to the in-memory rank index and report the rank change"""
+    rank_index.update(totals["github_username"], totals["category"], totals["points"], totals["pr_count"])
+    current = rank_index.rank(totals["github_username"])
+    
+    previous_rank = previous["rank"] if previous and previous["category"] == totals["category"] else None
+    rank = current["rank"] if current else None
+    result = {
+        **totals,
+        "previous_rank": previous_rank,
+        "rank": rank,
+        # Positive when the user climbed; None when they were not ranked in this category before
+        "rank_delta": previous_rank - rank if previous_rank is not None and rank is not None else None
+    }
     
-    conn.commit()
-    conn.close()
+    previous_category = previous["category"] if previous else None
+    versions.bump(f"user:{totals['github_username']}", f"leaderboard:{totals['category']}",
+                  f"leaderboard:{previous_category or totals['category']}")
+    broadcaster.publish({**result, "previous_category": previous_category})
+    return result
 
-def get_or_create_user(github_username: str, category: str = 'fullstack') -> dict:
-    """Get user from database or create if doesn't exist"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+def score_merged_pr(conn, github_username: str, repo_name: str, pr_number: int, issues: List[dict],
+                    merged_at: Optional[str] = None) -> Optional[dict]:
+    """Record a merged PR, award the points of every issue it closes and log them in one transaction.
     
-    cursor.execute('SELECT * FROM users WHERE github_username = ?', (github_username,))
-    user = cursor.fetchone()
+    Runs on the db writer thread, which serializes it with every other write.
+
+    Each issue is a dict with repository, issue_number, points and category; the PR is scored in
+    the category of the first one. Returns the user's new totals with their rank change, or None
+    if this PR was already scored.
+    """
+    points = sum(issue["points"] for issue in issues)
+    category = issues[0]["category"]
+    previous = rank_index.rank(github_username)
     
-    if not user:
+    cursor = conn.cursor()
+    try:
+        # Take the write lock up front so the whole scoring step is one atomic unit
+        cursor.execute('BEGIN IMMEDIATE')
+        
         cursor.execute('''
-            INSERT INTO users (github_username, category, points, pr_count, issues_solved)
-            VALUES (?, ?, 0, 0, 0)
-        ''', (github_username, category))
-        conn.commit()
+            INSERT OR IGNORE INTO pull_requests
+                (pr_number, repository, github_username, issue_number, points_earned, category, merged_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (pr_number, repo_name, github_username, issues[0]["issue_number"], points, category, merged_at))
+        if cursor.rowcount == 0:
+            # UNIQUE(pr_number, repository): this merge has already been scored
+            conn.rollback()
+            return None
+        
+        totals = apply_user_points(cursor, github_username, points, category,
+                                   issues=len(issues), scored_at=merged_at)
         
-        cursor.execute('SELECT * FROM users WHERE github_username = ?', (github_username,))
-        user = cursor.fetchone()
+        # One activity per closed issue; their points add up to the PR's total
+        cursor.executemany(INSERT_ACTIVITY, [
+            ("pr_merged", github_username, repo_name, issue["issue_number"], pr_number, issue["points"], category,
+             f"Merged PR #{pr_number} solving issue " + (
+                 f"#{issue['issue_number']}" if issue["repository"] == repo_name
+                 else f"{issue['repository']}#{issue['issue_number']}"))
+            for issue in issues
+        ])
+        
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
     
-    conn.close()
-    return dict(user)
+    versions.bump("activities")
+    return publish_user_points(totals, previous)
 
-def update_user_points(github_username: str, points: int, category: str):
-    """Update user points in database"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Update or insert user
-    cursor.execute('''
-        INSERT OR IGNORE INTO users (github_username, category, points, pr_count, issues_solved)
-        VALUES (?, ?, 0, 0, 0)
-    ''', (github_username, category))
-    
-    cursor.execute('''
-        UPDATE users 
-        SET points = points + ?, pr_count = pr_count + 1, issues_solved = issues_solved + 1, 
-            category = ?, updated_at = CURRENT_TIMESTAMP
-        WHERE github_username = ?
-    ''', (points, category, github_username))
+# Seconds between checks for users changed by offline tools (backfill, rebuild)
+LEADERBOARD_RELOAD_INTERVAL = float(os.getenv("LEADERBOARD_RELOAD_INTERVAL", "5"))
+
+# leaderboard_state generation the snapshots and rank index were last built from
+loaded_generation = None
+reload_task: Optional[asyncio.Task] = None
+
+@app.on_event("startup")
+async def build_leaderboard_cache():
+    """Rebuild the leaderboard snapshots and rank index so writes made outside the API are picked up"""
+    def rebuild(conn):
+        cursor = conn.cursor()
+        rebuild_leaderboard_cache(cursor, CATEGORIES)
+        # Read in the same transaction, so a tool committing meanwhile is seen on the next check
+        generation = leaderboard_generation(cursor)
+        cursor.execute('SELECT github_username, category, points, pr_count FROM users WHERE points > 0')
+        rank_index.load(cursor.fetchall())
+        conn.commit()
+        return generation
     
-    conn.commit()
-    conn.close()
+    global loaded_generation
+    loaded_generation = await db.write(rebuild)
+
+async def reload_changed_leaderboard():
+    """Rebuild after an offline tool changed users; scoring writes in between are repaired by the rebuild"""
+    while True:
+        await asyncio.sleep(LEADERBOARD_RELOAD_INTERVAL)
+        try:
+            generation = await db.read(leaderboard_generation)
+            if generation != loaded_generation:
+                await build_leaderboard_cache()
+                # Any user, board or feed may have changed
+                versions.reset()
+                print(f"Reloaded leaderboard after an offline change (generation {generation})")
+        except Exception as exc:
+            print(f"Leaderboard reload check failed: {exc!r}")
+
+@app.on_event("startup")
+async def start_leaderboard_reload():
+    global reload_task
+    reload_task = asyncio.create_task(reload_changed_leaderboard())
+
+@app.on_event("startup")
+async def start_activity_writer():
+    """Start the background activity flusher"""
+    activity_writer.start()
 
 # GitHub OAuth endpoints
 @app.get("/api/v1/auth/github")
@@ -215,7 +445,10 @@ async def github_callback(code: str, state: Optional[str] = None):
     }
     
     headers = {"Accept": "application/json"}
-    response = requests.post(token_url, data=token_data, headers=headers)
+    try:
+        response = await github.post(token_url, data=token_data, headers=headers)
+    except httpx.HTTPError:
+        raise HTTPException(status_code=502, detail="GitHub is unavailable")
     
     if response.status_code != 200:
         raise HTTPException(status_code=400, detail="Failed to get access token")
@@ -229,7 +462,15 @@ async def github_callback(code: str, state: Optional[str] = None):
     # Get user info from GitHub
     user_url = "https://api.github.com/user"
     user_headers = {"Authorization": f"token {access_token}"}
-    user_response = requests.get(user_url, headers=user_headers)
+    try:
+        # Profile and emails are independent, so fetch them concurrently
+        email_url = "https://api.github.com/user/emails"
+        user_response, email_response = await asyncio.gather(
+            github.get(user_url, headers=user_headers),
+            github.get(email_url, headers=user_headers)
+        )
+    except httpx.HTTPError:
+        raise HTTPException(status_code=502, detail="GitHub is unavailable")
     
     if user_response.status_code != 200:
         raise HTTPException(status_code=400, detail="Failed to get user info")
@@ -237,8 +478,6 @@ async def github_callback(code: str, state: Optional[str] = None):
     user_data = user_response.json()
     
     # Get user email
-    email_url = "https://api.github.com/user/emails"
-    email_response = requests.get(email_url, headers=user_headers)
     email = None
     if email_response.status_code == 200:
         emails = email_response.json()
@@ -249,7 +488,18 @@ async def github_callback(code: str, state: Optional[str] = None):
     github_username = user_data["login"]
     full_name = user_data.get("name")
     
-    conn = get_db_connection()
+    created = await db.write(save_oauth_user, github_username, full_name, email)
+    if created:
+        await log_activity("user_login", github_username=github_username, 
+                           details=f"New user logged in via GitHub OAuth")
+    
+    # Redirect to frontend with user info
+    frontend_url = os.getenv("FRONTEND_URL", "http://localhost:3000")
+    redirect_url = f"{frontend_url}/auth/callback?token={access_token}&username={github_username}"
+    return RedirectResponse(url=redirect_url)
+
+def save_oauth_user(conn, github_username: str, full_name: Optional[str], email: Optional[str]) -> bool:
+    """Create or update the user behind an OAuth login (runs on the db writer); True if it was created"""
     cursor = conn.cursor()
     
     # Check if user exists
@@ -263,46 +513,73 @@ async def github_callback(code: str, state: Optional[str] = None):
             VALUES (?, ?, ?, 'fullstack', 0, 0, 0)
         ''', (github_username, full_name, email))
         conn.commit()
-        
-        log_activity("user_login", github_username=github_username, 
-                    details=f"New user logged in via GitHub OAuth")
+        versions.bump(f"user:{github_username}")
+        return True
     else:
         # Update existing user info
         cursor.execute('''
             UPDATE users SET full_name = ?, email = ?, updated_at = CURRENT_TIMESTAMP
             WHERE github_username = ?
         ''', (full_name, email, github_username))
+        
+        # Names are part of the snapshot; a user inside it has their row updated in place
+        ranked_name_changed = existing_user["full_name"] != full_name and existing_user["points"] > 0
+        if ranked_name_changed:
+            cursor.execute('UPDATE leaderboard_cache SET full_name = ? WHERE github_username = ?',
+                           (full_name, github_username))
         conn.commit()
-    
-    conn.close()
-    
-    # Redirect to frontend with user info
-    frontend_url = os.getenv("FRONTEND_URL", "http://localhost:3000")
-    redirect_url = f"{frontend_url}/auth/callback?token={access_token}&username={github_username}"
-    return RedirectResponse(url=redirect_url)
+        
+        versions.bump(f"user:{github_username}")
+        if ranked_name_changed:
+            versions.bump(f"leaderboard:{existing_user['category']}")
+        return False
 
-@app.get("/api/v1/auth/verify")
-async def verify_token(authorization: HTTPAuthorizationCredentials = Depends(security)):
-    """Verify GitHub token and return user info"""
-    token = authorization.credentials
+# Verified bearer tokens, keyed by SHA-256 of the token so raw tokens are never held
+TOKEN_CACHE_TTL = float(os.getenv("TOKEN_CACHE_TTL", "300"))
+TOKEN_CACHE_NEGATIVE_TTL = float(os.getenv("TOKEN_CACHE_NEGATIVE_TTL", "60"))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+INVALID_TOKEN = object()
+
+token_cache = TTLCache(max_size=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL)
+
+def token_cache_key(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+async def resolve_token_login(token: str) -> str:
+    """Resolve a GitHub token to its login, consulting the token cache first"""
+    cache_key = token_cache_key(token)
+    cached = token_cache.get(cache_key)
+    if cached is INVALID_TOKEN:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if cached is not None:
+        return cached
     
     # Verify token with GitHub
     user_url = "https://api.github.com/user"
     headers = {"Authorization": f"token {token}"}
-    response = requests.get(user_url, headers=headers)
+    try:
+        response = await github.get(user_url, headers=headers)
+    except httpx.HTTPError:
+        raise HTTPException(status_code=502, detail="GitHub is unavailable")
     
     if response.status_code != 200:
+        # Only a definite rejection is cached; rate limits and outages are retried next time
+        if response.status_code == 401:
+            token_cache.set(cache_key, INVALID_TOKEN, ttl=TOKEN_CACHE_NEGATIVE_TTL)
         raise HTTPException(status_code=401, detail="Invalid token")
     
-    user_data = response.json()
-    github_username = user_data["login"]
+    github_username = response.json()["login"]
+    token_cache.set(cache_key, github_username)
+    return github_username
+
+@app.get("/api/v1/auth/verify")
+async def verify_token(authorization: HTTPAuthorizationCredentials = Depends(security)):
+    """Verify GitHub token and return user info"""
+    github_username = await resolve_token_login(authorization.credentials)
     
+    # The user row changes with every score update, so it is always read fresh
     # Get user from database
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM users WHERE github_username = ?', (github_username,))
-    user = cursor.fetchone()
-    conn.close()
+    user = await db.fetch_one('SELECT * FROM users WHERE github_username = ?', (github_username,))
     
     if not user:
         raise HTTPException(status_code=404, detail="User not found in database")
@@ -312,8 +589,30 @@ async def verify_token(authorization: HTTPAuthorizationCredentials = Depends(sec
         "user": dict(user)
     }
 
+@app.delete("/api/v1/auth/verify")
+async def forget_token(authorization: HTTPAuthorizationCredentials = Depends(security)):
+    """Evict a token from the verification cache (e.g. on logout)"""
+    evicted = token_cache.delete(token_cache_key(authorization.credentials))
+    return {"message": "Token evicted" if evicted else "Token was not cached"}
+
+# Queue mode: acknowledge deliveries immediately and score them in background workers
+WEBHOOK_QUEUE_ENABLED = os.getenv("WEBHOOK_QUEUE_ENABLED", "false").lower() in ("1", "true", "yes")
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "2"))
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "20"))
+
+# Recently handled deliveries and scored PRs; the database keys behind them are authoritative
+WEBHOOK_DEDUPE_SIZE = int(os.getenv("WEBHOOK_DEDUPE_SIZE", "50000"))
+WEBHOOK_DEDUPE_TTL = float(os.getenv("WEBHOOK_DEDUPE_TTL", "86400"))
+
+recent_deliveries = TTLCache(max_size=WEBHOOK_DEDUPE_SIZE, ttl=WEBHOOK_DEDUPE_TTL)
+scored_pull_requests = TTLCache(max_size=WEBHOOK_DEDUPE_SIZE, ttl=WEBHOOK_DEDUPE_TTL)
+
+def duplicate_delivery_response(delivery_id: str) -> dict:
+    return {"status": "duplicate", "message": f"Delivery {delivery_id} already processed"}
+
 @app.post("/api/v1/webhook/github")
-async def github_webhook(request: Request, x_github_event: str = Header(None), x_hub_signature_256: str = Header(None)):
+async def github_webhook(request: Request, x_github_event: str = Header(None), x_hub_signature_256: str = Header(None),
+                         x_github_delivery: str = Header(None)):
     """Handle GitHub webhook events"""
     payload_body = await request.body()
     
@@ -322,13 +621,49 @@ async def github_webhook(request: Request, x_github_event: str = Header(None), x
     # if webhook_secret and not verify_github_signature(payload_body, x_hub_signature_256, webhook_secret):
     #     raise HTTPException(status_code=401, detail="Invalid signature")
     
+    # Redeliveries are rejected before any parsing, network call or write
+    if x_github_delivery and recent_deliveries.get(x_github_delivery):
+        return duplicate_delivery_response(x_github_delivery)
+    
+    if WEBHOOK_QUEUE_ENABLED:
+        # Store the raw delivery untouched; parsing and scoring happen in the workers
+        queue_id = await db.write(enqueue_delivery, x_github_delivery, x_github_event, payload_body)
+        
+        # The workers remember the delivery once it is done; a failed one can be redelivered
+        if queue_id is None:
+            return duplicate_delivery_response(x_github_delivery)
+        webhook_workers.notify()
+        
+        return JSONResponse(status_code=202, content={
+            "status": "queued",
+            "message": "Webhook queued",
+            "queue_id": queue_id
+        })
+    
     try:
         payload = json.loads(payload_body.decode('utf-8'))
     except json.JSONDecodeError:
         raise HTTPException(status_code=400, detail="Invalid JSON payload")
     
-    event_type = x_github_event
+    await process_webhook_event(x_github_event, payload)
     
+    # Only remembered once processed, so a delivery that failed can still be redelivered
+    if x_github_delivery:
+        recent_deliveries.set(x_github_delivery, True)
+    
+    return {"status": "success", "message": "Webhook processed"}
+
+async def process_webhook_event(event_type: Optional[str], payload: dict):
+    """Route a parsed webhook payload to its handler"""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        await dispatch_webhook_event(event_type, payload)
+        outcome = "ok"
+    finally:
+        webhook_event_seconds.observe(time.perf_counter() - started, event_type or "unknown", outcome)
+
+async def dispatch_webhook_event(event_type: Optional[str], payload: dict):
     if event_type == "pull_request" and payload.get("action") == "closed":
         pr = payload["pull_request"]
         
@@ -336,80 +671,230 @@ async def github_webhook(request: Request, x_github_event: str = Header(None), x
         if pr.get("merged"):
             await handle_pr_merged(payload)
     
-    elif event_type == "issues" and payload.get("action") in ["opened", "labeled"]:
+    elif event_type == "issues" and payload.get("action") in ["opened", "labeled", "unlabeled"]:
         await handle_issue_event(payload)
+
+def remember_deliveries(delivery_ids: List[str]):
+    for delivery_id in delivery_ids:
+        recent_deliveries.set(delivery_id, True)
+
+webhook_workers = WebhookWorkers(process_webhook_event, workers=WEBHOOK_WORKERS, batch_size=WEBHOOK_BATCH_SIZE,
+                                 on_done=remember_deliveries)
+
+@app.on_event("startup")
+async def start_webhook_workers():
+    """Start draining the webhook queue when queue mode is enabled"""
+    if WEBHOOK_QUEUE_ENABLED:
+        await webhook_workers.start()
+
+@app.get("/api/v1/webhook/queue")
+async def get_webhook_queue_stats():
+    """Get webhook queue depth and lag"""
+    stats = await db.read(queue_stats)
     
-    return {"status": "success", "message": "Webhook processed"}
+    return {
+        "message": "Success",
+        "enabled": WEBHOOK_QUEUE_ENABLED,
+        "queue": stats
+    }
 
-async def handle_pr_merged(payload: dict):
+async def handle_pr_merged(payload: dict) -> Optional[dict]:
     """Handle merged pull request"""
     pr = payload["pull_request"]
     user_login = pr["user"]["login"]
     repo_name = payload["repository"]["full_name"]
     
-    # Get associated issue if PR closes an issue
-    issue_number = None
-    pr_body = pr.get("body", "")
+    references = parse_closing_references(pr.get("body"), repo_name)
+    if not references:
+        return None
+    
+    # A PR is scored at most once; check before any GitHub lookup
+    if await pull_request_already_scored(repo_name, pr["number"]):
+        return None
+    
+    # Local rows first, then one batched lookup for whatever is missing or stale
+    scorings = await resolve_issues_scoring(references)
+    issues = [
+        {"repository": repository, "issue_number": number, **scorings[(repository, number)]}
+        for repository, number in references if scorings.get((repository, number))
+    ]
+    if not issues:
+        return None
+    
+    # Record the PR, award the points for every closed issue and log the activities atomically
+    result = await db.write(score_merged_pr, user_login, repo_name, pr["number"], issues, pr.get("merged_at"))
+    scored_pull_requests.set((repo_name, pr["number"]), True)
+    return result
+
+async def pull_request_already_scored(repo_name: str, pr_number: int) -> bool:
+    """Check the recent-PR set, then the pull_requests unique key"""
+    if scored_pull_requests.get((repo_name, pr_number)):
+        return True
+    
+    scored = await db.fetch_one(
+        'SELECT 1 FROM pull_requests WHERE pr_number = ? AND repository = ?', (pr_number, repo_name)
+    ) is not None
+    
+    if scored:
+        scored_pull_requests.set((repo_name, pr_number), True)
+    return scored
+
+# Local issue rows older than this are revalidated against GitHub
+ISSUE_CACHE_MAX_AGE = int(os.getenv("ISSUE_CACHE_MAX_AGE", "3600"))
+
+def store_issue(cursor, repo_name: str, issue_number: int, title: str, labels: List[dict],
+                etag: Optional[str] = None) -> dict:
+    """Score an issue from its labels and upsert it into the issues table"""
+    points, category = label_rules.classify(labels, repo_name)
+    label_names = json.dumps([label.get('name', '') for label in labels])
+    
+    cursor.execute('''
+        INSERT INTO issues (issue_number, repository, title, category, points, status, labels, etag, fetched_at)
+        VALUES (?, ?, ?, ?, ?, 'open', ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(issue_number, repository) DO UPDATE SET
+            title = excluded.title, category = excluded.category, points = excluded.points,
+            labels = excluded.labels, etag = COALESCE(excluded.etag, issues.etag),
+            fetched_at = excluded.fetched_at
+    ''', (issue_number, repo_name, title, category, points, label_names, etag))
+    
+    return {"points": points, "category": category}
+
+async def resolve_issue_scoring(repo_name: str, issue_number: int) -> Optional[dict]:
+    """Get an issue's points and category, local-first with a conditional GitHub fallback"""
+    row = await db.fetch_one('''
+        SELECT points, category, etag,
+               (julianday('now') - julianday(fetched_at)) * 86400 AS age
+        FROM issues WHERE repository = ? AND issue_number = ?
+    ''', (repo_name, issue_number))
+    
+    local = {"points": row["points"], "category": row["category"]} if row else None
+    if row and row["age"] is not None and row["age"] < ISSUE_CACHE_MAX_AGE:
+        return local
+    
+    # Missing or stale: revalidate, but keep scoring from the local row if GitHub can't answer
+    github_token = os.getenv("GITHUB_TOKEN")
+    if not github_token:
+        return local
+    
+    issue_url = f"https://api.github.com/repos/{repo_name}/issues/{issue_number}"
+    headers = {"Authorization": f"token {github_token}"}
+    if row and row["etag"]:
+        headers["If-None-Match"] = row["etag"]
     
-    # Look for "Closes #123", "Fixes #123", etc.
-    import re
-    issue_refs = re.findall(r'(?:close[sd]?|fix(?:e[sd])?|resolve[sd]?)\s+#(\d+)', pr_body, re.IGNORECASE)
+    try:
+        response = await github.get(issue_url, headers=headers)
+    except httpx.HTTPError:
+        return local
     
-    if issue_refs:
-        issue_number = int(issue_refs[0])
-        
-        # Fetch issue details to get labels and points
-        github_token = os.getenv("GITHUB_TOKEN")
-        if github_token:
-            issue_url = f"https://api.github.com/repos/{repo_name}/issues/{issue_number}"
-            headers = {"Authorization": f"token {github_token}"}
+    if response.status_code == 304:
+        # Unchanged (and not counted against the rate limit); just mark it fresh
+        await db.execute('''
+            UPDATE issues SET fetched_at = CURRENT_TIMESTAMP WHERE repository = ? AND issue_number = ?
+        ''', (repo_name, issue_number))
+        return local
+    
+    if response.status_code != 200:
+        return local
+    
+    issue_data = response.json()
+    return await db.write(lambda conn: store_issue(
+        conn.cursor(), repo_name, issue_number, issue_data.get("title", ""),
+        issue_data.get("labels", []), response.headers.get("ETag")
+    ))
+
+async def fetch_issues_graphql(references: List[tuple]) -> dict:
+    """Fetch title and labels for many issues in one GraphQL round trip: {(repo, number): issue}"""
+    github_token = os.getenv("GITHUB_TOKEN")
+    if not github_token:
+        return {}
+    
+    # One aliased issue() field per reference, with every value passed as a variable
+    declarations = []
+    fields = []
+    variables = {}
+    for index, (repository, number) in enumerate(references):
+        owner, _, name = repository.partition("/")
+        declarations.append(f"$o{index}: String!, $r{index}: String!, $n{index}: Int!")
+        fields.append(
+            f"i{index}: repository(owner: $o{index}, name: $r{index}) "
+            f"{{ issue(number: $n{index}) {{ title labels(first: 100) {{ nodes {{ name }} }} }} }}"
+        )
+        variables.update({f"o{index}": owner, f"r{index}": name, f"n{index}": number})
+    query = f"query({', '.join(declarations)}) {{ {' '.join(fields)} }}"
+    
+    try:
+        response = await github.graphql(query, variables, headers={"Authorization": f"bearer {github_token}"})
+    except httpx.HTTPError:
+        return {}
+    if response.status_code != 200:
+        return {}
+    
+    # Missing repositories or issues come back as null alongside an "errors" list
+    data = response.json().get("data") or {}
+    issues = {}
+    for index, reference in enumerate(references):
+        issue = (data.get(f"i{index}") or {}).get("issue")
+        if issue:
+            issues[reference] = {
+                "title": issue.get("title", ""),
+                "labels": (issue.get("labels") or {}).get("nodes") or []
+            }
+    return issues
+
+async def resolve_issues_scoring(references: List[tuple]) -> dict:
+    """Points and category for several issues: local rows first, then one batched GitHub lookup"""
+    if not references:
+        return {}
+    
+    placeholders = ", ".join("(?, ?)" for _ in references)
+    rows = await db.fetch_all(f'''
+        SELECT repository, issue_number, points, category,
+               (julianday('now') - julianday(fetched_at)) * 86400 AS age
+        FROM issues WHERE (repository, issue_number) IN (VALUES {placeholders})
+    ''', [value for reference in references for value in reference])
+    rows = {(row["repository"], row["issue_number"]): row for row in rows}
+    
+    scorings = {}
+    pending = []
+    for reference in references:
+        row = rows.get(reference)
+        scorings[reference] = {"points": row["points"], "category": row["category"]} if row else None
+        if row is None or row["age"] is None or row["age"] >= ISSUE_CACHE_MAX_AGE:
+            pending.append(reference)
+    
+    if len(pending) == 1:
+        # A single issue keeps the conditional REST request, which a 304 makes free
+        scorings[pending[0]] = await resolve_issue_scoring(*pending[0])
+    elif pending:
+        fetched = await fetch_issues_graphql(pending)
+        if fetched:
+            def store_fetched(conn):
+                cursor = conn.cursor()
+                return {
+                    (repository, number): store_issue(cursor, repository, number, issue["title"], issue["labels"])
+                    for (repository, number), issue in fetched.items()
+                }
             
-            response = requests.get(issue_url, headers=headers)
-            if response.status_code == 200:
-                issue_data = response.json()
-                labels = issue_data.get("labels", [])
-                
-                points = extract_points_from_labels(labels)
-                category = determine_category_from_labels(labels)
-                
-                # Update user points
-                update_user_points(user_login, points, category)
-                
-                # Log activity
-                log_activity(
-                    activity_type="pr_merged",
-                    github_username=user_login,
-                    repository=repo_name,
-                    issue_number=issue_number,
-                    pr_number=pr["number"],
-                    points=points,
-                    category=category,
-                    details=f"Merged PR #{pr['number']} solving issue #{issue_number}"
-                )
+            scorings.update(await db.write(store_fetched))
+        # Anything GitHub could not answer keeps scoring from its (possibly stale) local row
+    
+    return scorings
 
 async def handle_issue_event(payload: dict):
-    """Handle issue opened or labeled events"""
+    """Handle issue opened, labeled or unlabeled events"""
     issue = payload["issue"]
     repo_name = payload["repository"]["full_name"]
     labels = issue.get("labels", [])
     
-    points = extract_points_from_labels(labels)
-    category = determine_category_from_labels(labels)
-    
     # Store issue in database
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    scoring = await db.write(lambda conn: store_issue(conn.cursor(), repo_name, issue["number"],
+                                                      issue["title"], labels))
     
-    cursor.execute('''
-        INSERT OR REPLACE INTO issues (issue_number, repository, title, category, points, status)
-        VALUES (?, ?, ?, ?, ?, 'open')
-    ''', (issue["number"], repo_name, issue["title"], category, points))
-    
-    conn.commit()
-    conn.close()
+    points = scoring["points"]
+    category = scoring["category"]
     
     # Log activity
-    log_activity(
+    await log_activity(
         activity_type="issue_opened",
         repository=repo_name,
         issue_number=issue["number"],
@@ -418,132 +903,560 @@ async def handle_issue_event(payload: dict):
         details=f"New {category} issue opened: {issue['title']}"
     )
 
-@app.get("/api/v1/leaderboard/{category}")
-async def get_leaderboard(category: str):
-    """Get leaderboard for specific category"""
-    if category not in ["fullstack", "aiml"]:
+LIVE_KEEPALIVE_SECONDS = 15
+LIVE_COALESCE_SECONDS = int(os.getenv("LIVE_COALESCE_MS", "100")) / 1000
+
+@app.on_event("startup")
+async def bind_broadcaster():
+    """Let write paths on other threads hand updates to the event loop"""
+    broadcaster.bind(asyncio.get_running_loop())
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+def live_snapshot(conn, categories: List[str]) -> dict:
+    cursor = conn.cursor()
+    return {category: get_cached_leaderboard(cursor, category)[0] for category in categories}
+
+@app.get("/api/v1/leaderboard/stream")
+async def stream_leaderboard(request: Request, category: Optional[str] = None):
+    """Stream a leaderboard snapshot followed by coalesced rank/points diffs (Server-Sent Events)"""
+    if category is not None and category not in CATEGORIES:
         raise HTTPException(status_code=400, detail="Invalid category. Use 'fullstack' or 'aiml'")
+    categories = [category] if category else CATEGORIES
+    
+    # Subscribe before reading the snapshot so no update can fall in between;
+    # diffs carry absolute totals, so replaying one the snapshot already has is harmless
+    subscriber = broadcaster.subscribe(category)
+    
+    async def events():
+        try:
+            yield sse_event("snapshot", await db.read(live_snapshot, categories))
+            while not await request.is_disconnected():
+                frame = await subscriber.next_frame(LIVE_KEEPALIVE_SECONDS, LIVE_COALESCE_SECONDS)
+                if frame is None:
+                    yield ": keep-alive\n\n"
+                elif frame[0] == "snapshot":
+                    yield sse_event("snapshot", await db.read(live_snapshot, categories))
+                else:
+                    yield sse_event("diff", frame[1])
+        finally:
+            broadcaster.unsubscribe(subscriber)
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+# Final JSON bytes (plus gzip/brotli variants) of hot leaderboard responses, keyed by ETag
+response_cache = ResponseCache(max_bytes=int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024))))
+
+def build_leaderboard_payload(conn, category: str, limit: Optional[int], cursor: Optional[str]) -> dict:
+    if limit is None and cursor is None:
+        leaderboard, next_cursor = get_cached_leaderboard(conn.cursor(), category)
+        
+        return {
+            "message": "Success",
+            "category": category,
+            "leaderboard": leaderboard,
+            "next_cursor": next_cursor
+        }
+    
+    after = decode_cursor(cursor) if cursor else None
+    leaderboard, next_cursor = get_leaderboard_page(conn.cursor(), category, limit or 50, after)
     
-    conn = get_db_connection()
+    return {
+        "message": "Success",
+        "category": category,
+        "leaderboard": leaderboard,
+        "next_cursor": next_cursor
+    }
+
+def build_all_leaderboards_payload(conn, limit: int) -> dict:
     cursor = conn.cursor()
     
+    # Serve the top of each category from the ranked snapshots
+    leaderboards = {}
+    next_cursors = {}
+    for category in CATEGORIES:
+        # Continue with /api/v1/leaderboard/{category}?cursor=...
+        leaderboards[category], next_cursors[category] = get_cached_leaderboard(cursor, category, limit)
+    
+    return {
+        "message": "Success",
+        "leaderboards": leaderboards,
+        "next_cursors": next_cursors
+    }
+
+@app.get("/api/v1/leaderboard/{category}")
+async def get_leaderboard(request: Request, category: str,
+                          limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+                          cursor: Optional[str] = None):
+    """Get leaderboard for specific category, optionally one keyset page at a time"""
+    if category not in CATEGORIES:
+        raise HTTPException(status_code=400, detail="Invalid category. Use 'fullstack' or 'aiml'")
+    
+    scope = f"leaderboard:{category}"
+    etag = versions.etag(scope, variant=f"limit={limit}&cursor={cursor}")
+    last_modified = versions.last_modified(scope)
+    not_modified = not_modified_response(request, etag, last_modified)
+    if not_modified:
+        return not_modified
+    
+    # Serialization and compression happen once per version, not once per request, and on a db thread
+    body = await response_cache.get_or_build(
+        etag, lambda: db.read(encoded(build_leaderboard_payload), category, limit, cursor))
+    return body.to_response(request.headers.get("accept-encoding"), conditional_headers(etag, last_modified))
+
+WINDOW_PERIODS = ("day", "week", "month")
+
+def resolve_window(period: str, start: Optional[str], end: Optional[str]) -> tuple:
+    """Turn a named period (UTC, weeks start on Monday) or explicit dates into inclusive day bounds"""
+    today = datetime.utcnow().date()
+    if start or end:
+        try:
+            start_day = date.fromisoformat(start) if start else date.min
+            end_day = date.fromisoformat(end) if end else today
+        except ValueError:
+            raise HTTPException(status_code=400, detail="start and end must be YYYY-MM-DD dates")
+        if start_day > end_day:
+            raise HTTPException(status_code=400, detail="start must not be after end")
+        return start_day.isoformat(), end_day.isoformat()
+    
+    if period not in WINDOW_PERIODS:
+        raise HTTPException(status_code=400, detail="Invalid period. Use 'day', 'week' or 'month'")
+    if period == "day":
+        start_day = today
+    elif period == "week":
+        start_day = today - timedelta(days=today.weekday())
+    else:
+        start_day = today.replace(day=1)
+    return start_day.isoformat(), today.isoformat()
+
+def build_window_leaderboard_payload(conn, category: str, start_day: str, end_day: str, limit: int) -> dict:
+    cursor = conn.cursor()
+    # A range scan of the (category, day) primary key, then a group-by over the users active in the window
     cursor.execute('''
-        SELECT github_username, full_name, category, points, pr_count, issues_solved,
-               ROW_NUMBER() OVER (ORDER BY points DESC, pr_count DESC) as rank
-        FROM users 
-        WHERE category = ? AND points > 0
-        ORDER BY points DESC, pr_count DESC
-    ''', (category,))
+        SELECT s.github_username, u.full_name, SUM(s.points) AS points,
+               SUM(s.pr_count) AS pr_count, SUM(s.issues_solved) AS issues_solved
+        FROM user_daily_scores s
+        LEFT JOIN users u ON u.github_username = s.github_username
+        WHERE s.category = ? AND s.day BETWEEN ? AND ?
+        GROUP BY s.github_username
+        HAVING SUM(s.points) > 0
+        ORDER BY points DESC, pr_count DESC, s.github_username
+        LIMIT ?
+    ''', (category, start_day, end_day, limit))
     
-    leaderboard = [dict(row) for row in cursor.fetchall()]
-    conn.close()
+    leaderboard = [{"rank": rank, **dict(row)} for rank, row in enumerate(cursor.fetchall(), start=1)]
     
     return {
         "message": "Success",
         "category": category,
+        "window": {"start": start_day, "end": end_day},
         "leaderboard": leaderboard
     }
 
+@app.get("/api/v1/leaderboard/{category}/window")
+async def get_window_leaderboard(request: Request, category: str, period: str = "week",
+                                 start: Optional[str] = None, end: Optional[str] = None,
+                                 limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE)):
+    """Leaderboard of points earned within a period or an explicit date range"""
+    if category not in CATEGORIES:
+        raise HTTPException(status_code=400, detail="Invalid category. Use 'fullstack' or 'aiml'")
+    
+    start_day, end_day = resolve_window(period, start, end)
+    
+    # Every scoring write in the category bumps this scope, so a cached window lives until the next write
+    scope = f"leaderboard:{category}"
+    etag = versions.etag(scope, variant=f"window={start_day}..{end_day}&limit={limit}")
+    last_modified = versions.last_modified(scope)
+    not_modified = not_modified_response(request, etag, last_modified)
+    if not_modified:
+        return not_modified
+    
+    body = await response_cache.get_or_build(
+        etag, lambda: db.read(encoded(build_window_leaderboard_payload), category, start_day, end_day, limit))
+    return body.to_response(request.headers.get("accept-encoding"), conditional_headers(etag, last_modified))
+
 @app.get("/api/v1/leaderboard")
-async def get_all_leaderboards():
+async def get_all_leaderboards(request: Request, limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE)):
     """Get both leaderboards"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Get fullstack leaderboard
-    cursor.execute('''
-        SELECT github_username, full_name, category, points, pr_count, issues_solved,
-               ROW_NUMBER() OVER (ORDER BY points DESC, pr_count DESC) as rank
-        FROM users 
-        WHERE category = 'fullstack' AND points > 0
-        ORDER BY points DESC, pr_count DESC
-        LIMIT 100
-    ''')
-    fullstack_leaderboard = [dict(row) for row in cursor.fetchall()]
-    
-    # Get AI/ML leaderboard
-    cursor.execute('''
-        SELECT github_username, full_name, category, points, pr_count, issues_solved,
-               ROW_NUMBER() OVER (ORDER BY points DESC, pr_count DESC) as rank
-        FROM users 
-        WHERE category = 'aiml' AND points > 0
-        ORDER BY points DESC, pr_count DESC
-        LIMIT 100
-    ''')
-    aiml_leaderboard = [dict(row) for row in cursor.fetchall()]
+    scopes = [f"leaderboard:{category}" for category in CATEGORIES]
+    etag = versions.etag(*scopes, variant=f"limit={limit}")
+    last_modified = versions.last_modified(*scopes)
+    not_modified = not_modified_response(request, etag, last_modified)
+    if not_modified:
+        return not_modified
+    
+    body = await response_cache.get_or_build(etag, lambda: db.read(encoded(build_all_leaderboards_payload), limit))
+    return body.to_response(request.headers.get("accept-encoding"), conditional_headers(etag, last_modified))
+
+ACTIVITY_MAX_PAGE_SIZE = 200
+
+@app.get("/api/v1/activities")
+async def get_activities(request: Request, response: Response, limit: int = Query(50, ge=1),
+                         cursor: Optional[str] = None, github_username: Optional[str] = None,
+                         type: Optional[str] = None, repository: Optional[str] = None,
+                         category: Optional[str] = None):
+    """Get recent activities, newest first, optionally filtered and one keyset page at a time"""
+    limit = min(limit, ACTIVITY_MAX_PAGE_SIZE)
+    
+    etag = versions.etag("activities", variant=str(sorted(request.query_params.multi_items()) + [limit]))
+    last_modified = versions.last_modified("activities")
+    not_modified = not_modified_response(request, etag, last_modified)
+    if not_modified:
+        return not_modified
+    response.headers.update(conditional_headers(etag, last_modified))
+    
+    # Each equality filter has an index on (column, created_at), so a page is one range scan
+    conditions = []
+    params = []
+    filters = {"github_username": github_username, "type": type, "repository": repository, "category": category}
+    for column, value in filters.items():
+        if value is not None:
+            conditions.append(f"{column} = ?")
+            params.append(value)
+    
+    if cursor:
+        created_at, activity_id = decode_token(cursor, (str, int))
+        conditions.append("(created_at, id) < (?, ?)")
+        params.extend([created_at, activity_id])
+    
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    
+    rows = await db.fetch_all(f'''
+        SELECT * FROM activities 
+        {where}
+        ORDER BY created_at DESC, id DESC 
+        LIMIT ?
+    ''', params + [limit + 1])
     
-    conn.close()
+    activities = [dict(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = activities[-1]
+        next_cursor = encode_token([last["created_at"], last["id"]])
     
     return {
         "message": "Success",
-        "leaderboards": {
-            "fullstack": fullstack_leaderboard,
-            "aiml": aiml_leaderboard
-        }
+        "activities": activities,
+        "next_cursor": next_cursor
     }
 
-@app.get("/api/v1/activities")
-async def get_activities(limit: int = 50):
-    """Get recent activities"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+@app.post("/api/v1/admin/compact-activities", dependencies=[Depends(require_admin)])
+async def compact_activity_log(horizon_days: int = Query(None, ge=1)):
+    """Archive and roll up activities older than the retention horizon"""
+    # Flush buffered rows first so the feed and the archive agree
+    await asyncio.to_thread(activity_writer.flush)
+    kwargs = {"horizon_days": horizon_days} if horizon_days else {}
+    result = await asyncio.to_thread(compact_activities, **kwargs)
     
-    cursor.execute('''
-        SELECT * FROM activities 
-        ORDER BY created_at DESC 
-        LIMIT ?
-    ''', (limit,))
+    if result["archived"]:
+        versions.bump("activities")
     
-    activities = [dict(row) for row in cursor.fetchall()]
-    conn.close()
+    return {
+        "message": "Success",
+        "compaction": result
+    }
+
+@app.post("/api/v1/admin/rebuild-totals", dependencies=[Depends(require_admin)])
+async def rebuild_totals(rescore: bool = False, check: bool = False):
+    """Recompute user totals from the activity log, optionally re-scoring with the current label rules"""
+    result = await asyncio.to_thread(rebuild_user_totals, rescore=rescore, check_only=check)
+    
+    if result["applied"]:
+        # Snapshots, rank index and ETags all derive from the totals that just changed
+        await build_leaderboard_cache()
+        versions.bump(*(f"user:{change['github_username']}" for change in result["changes"]),
+                      *(f"leaderboard:{category}" for category in CATEGORIES))
+    
+    # A full rescore can touch every user; the count is in users_changed
+    result["changes"] = result["changes"][:100]
+    return {
+        "message": "Success",
+        "rebuild": result
+    }
+
+@app.post("/api/v1/admin/label-rules/reload", dependencies=[Depends(require_admin)])
+async def reload_label_rules():
+    """Recompile the label rules file and swap it in without a restart"""
+    try:
+        summary = label_rules.load()
+    except (OSError, ValueError, KeyError, TypeError) as exc:
+        # json.JSONDecodeError is a ValueError; the previous rules stay in effect
+        raise HTTPException(status_code=400, detail=f"Invalid label rules: {exc}")
     
     return {
         "message": "Success",
-        "activities": activities
+        "label_rules": summary
     }
 
+def insert_registered_user(conn, user: "User"):
+    """Insert a registered user and publish their totals (runs on the db writer)"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO users (github_username, full_name, email, category, points, pr_count, issues_solved,
+                           base_points, base_pr_count, base_issues_solved)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (user.github_username, user.full_name, user.email, user.category, 
+          user.points, user.pr_count, user.issues_solved,
+          # Not backed by pr_merged activities, so a rebuild must keep them
+          user.points, user.pr_count, user.issues_solved))
+    
+    totals = {
+        "github_username": user.github_username,
+        "category": user.category,
+        "points": user.points,
+        "pr_count": user.pr_count,
+        "issues_solved": user.issues_solved
+    }
+    # Users registered without points are unranked and leave the snapshot alone
+    if user.points > 0:
+        place_in_leaderboard_cache(cursor, None, totals)
+    
+    conn.commit()
+    publish_user_points(totals, None)
+
 @app.post("/api/v1/register")
 async def register_user(user: User):
     """Register a new user"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
     try:
-        cursor.execute('''
-            INSERT INTO users (github_username, full_name, email, category, points, pr_count, issues_solved)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (user.github_username, user.full_name, user.email, user.category, 
-              user.points, user.pr_count, user.issues_solved))
-        
-        conn.commit()
-        log_activity("user_registered", github_username=user.github_username, 
-                    category=user.category, details=f"User registered for {user.category} track")
-        
+        await db.write(insert_registered_user, user)
     except sqlite3.IntegrityError:
         raise HTTPException(status_code=400, detail="User already exists")
-    finally:
-        conn.close()
+    
+    await log_activity("user_registered", github_username=user.github_username, 
+                       category=user.category, details=f"User registered for {user.category} track")
     
     return {"message": "User registered successfully", "user": user}
 
 @app.get("/api/v1/user/{github_username}")
-async def get_user(github_username: str):
+async def get_user(request: Request, response: Response, github_username: str):
     """Get user details"""
-    conn = get_db_connection()
+    # The rank block also moves when others in the user's category score
+    rank = rank_index.rank(github_username)
+    scopes = [f"user:{github_username}"] + ([f"leaderboard:{rank['category']}"] if rank else [])
+    etag = versions.etag(*scopes)
+    last_modified = versions.last_modified(*scopes)
+    not_modified = not_modified_response(request, etag, last_modified)
+    if not_modified:
+        return not_modified
+    
+    user = await db.fetch_one('SELECT * FROM users WHERE github_username = ?', (github_username,))
+    
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    response.headers.update(conditional_headers(etag, last_modified))
+    return {
+        "message": "Success",
+        "user": dict(user),
+        "rank": rank
+    }
+
+@app.post("/api/v1/users/batch")
+async def get_users_batch(batch: UserBatchRequest):
+    """Get many users in one round trip, keyed by username, with their ranks"""
+    usernames = list(dict.fromkeys(batch.usernames))
+    
+    # One bound JSON array instead of a placeholder per name, so the batch size is not capped by SQLite
+    rows = await db.fetch_all('''
+        SELECT * FROM users WHERE github_username IN (SELECT value FROM json_each(?))
+    ''', (json.dumps(usernames),))
+    
+    users = {}
+    for row in rows:
+        users[row["github_username"]] = {**dict(row), "rank": rank_index.rank(row["github_username"])}
+    
+    return {
+        "message": "Success",
+        "users": users,
+        "missing": [username for username in usernames if username not in users]
+    }
+
+SEARCH_MAX_RESULTS = 50
+SEARCH_TERM = re.compile(r'\w+')
+# A match tier this large is walked in ranking order until it yields enough hits, instead of
+# being collected and sorted, so a one-letter query costs about what a full name does
+SEARCH_SORT_LIMIT = 1000
+
+SEARCH_COLUMNS = "github_username, full_name, category, points, pr_count, issues_solved"
+SEARCH_ORDER = "ORDER BY points DESC, pr_count DESC, github_username"
+
+def like_prefix(text: str) -> str:
+    """A LIKE pattern matching strings that start with text"""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+def search_tier(cursor, match_count_sql: str, count_params: list, small_index: str, condition: str,
+                params: list, category: Optional[str], limit: int) -> List[dict]:
+    """Top `limit` users meeting condition, in leaderboard order.
+
+    A small match set is collected through small_index and sorted; a large one walks the
+    ranking index and stops at the limit, which for a common prefix comes quickly.
+    """
+    cursor.execute(match_count_sql, count_params + [SEARCH_SORT_LIMIT])
+    if cursor.fetchone()[0] < SEARCH_SORT_LIMIT:
+        index = small_index
+    else:
+        index = "INDEXED BY idx_users_category_rank" if category else "INDEXED BY idx_users_rank"
+    
+    cursor.execute(f'''
+        SELECT {SEARCH_COLUMNS} FROM users {index}
+        WHERE {condition} {"AND category = ?" if category else ""}
+        {SEARCH_ORDER}
+        LIMIT ?
+    ''', params + ([category] if category else []) + [limit])
+    return [dict(row) for row in cursor.fetchall()]
+
+def search_users(conn, query: str, terms: List[str], category: Optional[str], limit: int) -> List[dict]:
+    """Prefix-match every term against usernames and names, ranked by match quality then points.
+
+    Tiers are fetched best first, each already in points order and only as deep as the
+    results still missing: the exact username, usernames starting with the query (through
+    idx_users_username_nocase), then the remaining full-text matches.
+    """
     cursor = conn.cursor()
+    prefix = like_prefix(query)
     
-    cursor.execute('SELECT * FROM users WHERE github_username = ?', (github_username,))
-    user = cursor.fetchone()
-    conn.close()
+    cursor.execute(f'''
+        SELECT {SEARCH_COLUMNS} FROM users INDEXED BY idx_users_username_nocase
+        WHERE github_username = ? COLLATE NOCASE {"AND category = ?" if category else ""}
+        {SEARCH_ORDER}
+        LIMIT ?
+    ''', [query] + ([category] if category else []) + [limit])
+    results = [dict(row) for row in cursor.fetchall()]
+    
+    if len(results) < limit:
+        results += search_tier(
+            cursor,
+            "SELECT COUNT(*) FROM (SELECT 1 FROM users WHERE github_username LIKE ? ESCAPE '\\' LIMIT ?)", [prefix],
+            "INDEXED BY idx_users_username_nocase",
+            "github_username LIKE ? ESCAPE '\\' AND github_username != ? COLLATE NOCASE", [prefix, query],
+            category, limit - len(results))
+    
+    if len(results) < limit:
+        # Each term becomes a quoted prefix phrase, so user input can never be read as FTS5 syntax
+        match = " ".join(f'"{term}"*' for term in terms)
+        results += search_tier(
+            cursor,
+            "SELECT COUNT(*) FROM (SELECT 1 FROM users_fts WHERE users_fts MATCH ? LIMIT ?)", [match],
+            "NOT INDEXED",
+            "id IN (SELECT rowid FROM users_fts WHERE users_fts MATCH ?) "
+            "AND NOT github_username LIKE ? ESCAPE '\\'", [match, prefix],
+            category, limit - len(results))
+    
+    return results
+
+@app.get("/api/v1/users/search")
+async def search_users_endpoint(q: str = Query(..., min_length=1, max_length=100),
+                                category: Optional[str] = None,
+                                limit: int = Query(10, ge=1, le=SEARCH_MAX_RESULTS)):
+    """Typeahead search over usernames and full names, ranked by match quality then points"""
+    if category is not None and category not in CATEGORIES:
+        raise HTTPException(status_code=400, detail="Invalid category. Use 'fullstack' or 'aiml'")
+    
+    query = q.strip()
+    terms = SEARCH_TERM.findall(query)[:8]
+    if not terms:
+        return {"message": "Success", "query": q, "results": []}
+    
+    try:
+        results = await db.read(search_users, query, terms, category, limit)
+    except sqlite3.OperationalError:
+        raise HTTPException(status_code=503, detail="User search is not available")
+    
+    for result in results:
+        result["rank"] = rank_index.rank(result["github_username"])
+    
+    return {
+        "message": "Success",
+        "query": q,
+        "results": results
+    }
+
+async def ensure_user_exists(github_username: str):
+    """Raise 404 if the user is not registered"""
+    user = await db.fetch_one('SELECT 1 FROM users WHERE github_username = ?', (github_username,))
     
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+
+@app.get("/api/v1/user/{github_username}/rank")
+async def get_user_rank(github_username: str):
+    """Get a user's rank and percentile within their category"""
+    rank = rank_index.rank(github_username)
+    if rank is None:
+        # Registered users without points are simply unranked
+        await ensure_user_exists(github_username)
     
     return {
         "message": "Success",
-        "user": dict(user)
+        "github_username": github_username,
+        "rank": rank
+    }
+
+@app.get("/api/v1/user/{github_username}/around")
+async def get_user_neighbours(github_username: str, n: int = Query(5, ge=1, le=50)):
+    """Get the n leaderboard entries above and below a user"""
+    around = rank_index.around(github_username, n)
+    if around is None:
+        await ensure_user_exists(github_username)
+        return {
+            "message": "Success",
+            "github_username": github_username,
+            "category": None,
+            "rank": None,
+            "leaderboard": []
+        }
+    
+    # Fill in display fields for the handful of neighbours
+    usernames = [entry["github_username"] for entry in around["entries"]]
+    rows = await db.fetch_all(f'''
+        SELECT github_username, full_name, issues_solved FROM users
+        WHERE github_username IN ({", ".join("?" * len(usernames))})
+    ''', usernames)
+    details = {row["github_username"]: row for row in rows}
+    
+    leaderboard = []
+    for entry in around["entries"]:
+        row = details.get(entry["github_username"])
+        leaderboard.append({
+            "github_username": entry["github_username"],
+            "full_name": row["full_name"] if row else None,
+            "category": around["category"],
+            "points": entry["points"],
+            "pr_count": entry["pr_count"],
+            "issues_solved": row["issues_solved"] if row else 0,
+            "rank": entry["rank"]
+        })
+    
+    return {
+        "message": "Success",
+        "github_username": github_username,
+        "category": around["category"],
+        "rank": around["rank"],
+        "leaderboard": leaderboard
     }
 
+@app.on_event("shutdown")
+async def shutdown():
+    """Stop producers before what they write through: queue workers, activity writer, then connections"""
+    if reload_task is not None:
+        reload_task.cancel()
+    # Workers finish their current delivery; unfinished ones are requeued on the next start
+    await webhook_workers.stop()
+    # Flushes buffered activities; anything logged after this is written through
+    await asyncio.to_thread(activity_writer.stop)
+    await github.aclose()
+    close_db_pool()
+    db.close()
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus scrape endpoint"""
+    return Response(content=metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 async def root():
     return {"message": "Leadership Board API is running!"}
@@ -0,0 +1,257 @@
+import re
+import threading
+import time
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+# Upper bounds in seconds; +Inf is implicit
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class _Sharded:
+    """Per-thread shards of label -> cell, so recording never takes a lock.
+
+    Each thread only ever mutates its own shard; the lock is held once per thread to
+    register the shard and by collect(), which sums every shard into one view.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._local = threading.local()
+        self._shards: List[dict] = []
+        self._lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def _snapshots(self) -> List[dict]:
+        with self._lock:
+            shards = list(self._shards)
+        # dict.copy() is atomic under the GIL, so a concurrent insert cannot break iteration
+        return [shard.copy() for shard in shards]
+
+class Counter(_Sharded):
+    TYPE = "counter"
+
+    def inc(self, *labels: str, amount: float = 1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def collect(self) -> Dict[tuple, float]:
+        totals: Dict[tuple, float] = {}
+        for shard in self._snapshots():
+            for labels, value in shard.items():
+                totals[labels] = totals.get(labels, 0) + value
+        return totals
+
+    def samples(self):
+        for labels, value in sorted(self.collect().items()):
+            yield self.name, self.labelnames, labels, value
+
+class Histogram(_Sharded):
+    """Fixed-bucket histogram; a cell is [count per bucket..., +Inf count, sum]"""
+
+    TYPE = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...],
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: str):
+        shard = self._shard()
+        cell = shard.get(labels)
+        if cell is None:
+            cell = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        cell[bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+
+    def time(self, *labels: str) -> "_Timer":
+        return _Timer(self, labels)
+
+    def collect(self) -> Dict[tuple, list]:
+        merged: Dict[tuple, list] = {}
+        for shard in self._snapshots():
+            for labels, cell in shard.items():
+                total = merged.get(labels)
+                if total is None:
+                    merged[labels] = list(cell)
+                else:
+                    for index, value in enumerate(cell):
+                        total[index] += value
+        return merged
+
+    def samples(self):
+        bounds = [format_value(bound) for bound in self.buckets] + ["+Inf"]
+        for labels, cell in sorted(self.collect().items()):
+            cumulative = 0
+            for bound, count in zip(bounds, cell):
+                cumulative += count
+                yield self.name + "_bucket", self.labelnames + ("le",), labels + (bound,), cumulative
+            yield self.name + "_count", self.labelnames, labels, cumulative
+            yield self.name + "_sum", self.labelnames, labels, cell[-1]
+
+class Gauge:
+    """Last-written value per label set; a plain dict store is atomic, so no shards are needed"""
+
+    TYPE = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[tuple, float] = {}
+
+    def set(self, value: float, *labels: str):
+        self._values[labels] = value
+
+    def samples(self):
+        for labels, value in sorted(self._values.copy().items()):
+            yield self.name, self.labelnames, labels, value
+
+class _Timer:
+    """Context manager that observes its elapsed wall time into a histogram"""
+
+    __slots__ = ("_histogram", "_labels", "_started")
+
+    def __init__(self, histogram: Histogram, labels: Tuple[str, ...]):
+        self._histogram = histogram
+        self._labels = labels
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._histogram.observe(time.perf_counter() - self._started, *self._labels)
+        return False
+
+def format_value(value: float) -> str:
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+def escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+class Registry:
+    def __init__(self):
+        self._metrics: list = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def render(self) -> str:
+        """Every metric in the Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.TYPE}")
+            for name, labelnames, labels, value in metric.samples():
+                if labelnames:
+                    pairs = ",".join(f'{key}="{escape_label(label)}"' for key, label in zip(labelnames, labels))
+                    lines.append(f"{name}{{{pairs}}} {format_value(value)}")
+                else:
+                    lines.append(f"{name} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+http_request_seconds = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ("method", "route"))
+http_responses = registry.counter(
+    "http_responses_total", "HTTP responses by route template and status code", ("method", "route", "status"))
+db_query_seconds = registry.histogram(
+    "db_query_duration_seconds", "Time spent running database work on a db thread, by query name", ("mode", "query"))
+db_queue_seconds = registry.histogram(
+    "db_queue_wait_seconds", "Time database work waited for a free db thread", ("mode",))
+github_request_seconds = registry.histogram(
+    "github_request_duration_seconds", "GitHub API call latency per attempt, by endpoint",
+    ("method", "endpoint", "status"))
+github_rate_limit_remaining = registry.gauge(
+    "github_rate_limit_remaining", "Last X-RateLimit-Remaining reported by GitHub", ("resource",))
+webhook_event_seconds = registry.histogram(
+    "webhook_event_duration_seconds", "Webhook event processing time by event and outcome", ("event", "outcome"))
+
+# GitHub paths collapse to templates so owners, repos and numbers do not explode label cardinality
+GITHUB_REPO_PATH = re.compile(r'^/repos/[^/]+/[^/]+')
+GITHUB_NUMBER_SEGMENT = re.compile(r'/\d+(?=/|$)')
+
+@lru_cache(maxsize=1024)
+def github_endpoint(url: str) -> str:
+    path = url.split("://", 1)[-1]
+    path = "/" + path.split("/", 1)[1] if "/" in path else "/"
+    path = path.split("?", 1)[0]
+    path = GITHUB_REPO_PATH.sub("/repos/{owner}/{repo}", path)
+    return GITHUB_NUMBER_SEGMENT.sub("/{number}", path)
+
+SQL_TABLE = re.compile(r'\b(?:FROM|INTO|UPDATE)\s+([A-Za-z_][\w.]*)', re.IGNORECASE)
+
+@lru_cache(maxsize=1024)
+def sql_name(sql: str) -> str:
+    """A short label for an ad-hoc statement, e.g. 'select users'"""
+    words = sql.split(None, 1)
+    verb = words[0].lower() if words else "sql"
+    table = SQL_TABLE.search(sql)
+    return f"{verb} {table.group(1)}" if table else verb
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency and status per route template.
+
+    The router stores the matched endpoint in the scope, which is mapped back to its path
+    template after the response; unmatched paths share one label so scanners cannot add series.
+    """
+
+    def __init__(self, app, skip_paths: Tuple[str, ...] = ("/metrics",)):
+        self.app = app
+        self.skip_paths = skip_paths
+        self._routes: Optional[Dict[object, str]] = None
+
+    def _route(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        if self._routes is None:
+            self._routes = {}
+            for route in getattr(scope.get("app"), "routes", []):
+                if hasattr(route, "endpoint") and hasattr(route, "path"):
+                    self._routes.setdefault(route.endpoint, route.path)
+        return self._routes.get(endpoint, "unmatched")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = self._route(scope)
+            method = scope["method"]
+            http_request_seconds.observe(time.perf_counter() - started, method, route)
+            http_responses.inc(method, route, str(status))
@@ -0,0 +1,245 @@
+import random
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# Sort key for a ranked user: best score first, username breaks ties
+RankKey = Tuple[int, int, str]
+
+MAX_LEVEL = 32
+
+def rank_key(github_username: str, points: int, pr_count: int) -> RankKey:
+    """Build the ascending sort key for a user (higher points / PRs sort first)"""
+    return (-points, -pr_count, github_username)
+
+class _Node:
+    __slots__ = ("key", "forward", "width")
+
+    def __init__(self, key: Optional[RankKey], level: int):
+        self.key = key
+        self.forward: List[Optional["_Node"]] = [None] * level
+        self.width: List[int] = [1] * level
+
+class IndexedSkipList:
+    """Sorted set of rank keys with O(log n) insert, remove, rank and positional access"""
+
+    def __init__(self):
+        self._head = _Node(None, MAX_LEVEL)
+        self._level = 1
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _random_level(self) -> int:
+        level = 1
+        while level < MAX_LEVEL and random.random() < 0.5:
+            level += 1
+        return level
+
+    def insert(self, key: RankKey):
+        """Insert a key (keys are expected to be unique)"""
+        update = [self._head] * MAX_LEVEL
+        steps = [0] * MAX_LEVEL
+        node = self._head
+        position = 0
+        for i in range(self._level - 1, -1, -1):
+            while node.forward[i] is not None and node.forward[i].key < key:
+                position += node.width[i]
+                node = node.forward[i]
+            update[i] = node
+            steps[i] = position
+
+        level = self._random_level()
+        if level > self._level:
+            for i in range(self._level, level):
+                update[i] = self._head
+                steps[i] = 0
+                self._head.width[i] = self._size + 1
+            self._level = level
+
+        new_node = _Node(key, level)
+        for i in range(level):
+            prev = update[i]
+            new_node.forward[i] = prev.forward[i]
+            prev.forward[i] = new_node
+            # Split the span of the predecessor around the new node
+            new_node.width[i] = prev.width[i] - (position - steps[i])
+            prev.width[i] = position - steps[i] + 1
+
+        for i in range(level, self._level):
+            update[i].width[i] += 1
+
+        self._size += 1
+
+    def remove(self, key: RankKey) -> bool:
+        """Remove a key, returning False if it was not present"""
+        update = [self._head] * MAX_LEVEL
+        node = self._head
+        for i in range(self._level - 1, -1, -1):
+            while node.forward[i] is not None and node.forward[i].key < key:
+                node = node.forward[i]
+            update[i] = node
+
+        target = node.forward[0]
+        if target is None or target.key != key:
+            return False
+
+        for i in range(self._level):
+            prev = update[i]
+            if prev.forward[i] is target:
+                prev.forward[i] = target.forward[i]
+                prev.width[i] += target.width[i] - 1
+            else:
+                prev.width[i] -= 1
+
+        while self._level > 1 and self._head.forward[self._level - 1] is None:
+            self._level -= 1
+
+        self._size -= 1
+        return True
+
+    def rank(self, key: RankKey) -> Optional[int]:
+        """Return the 1-based position of a key, or None if it is not present"""
+        node = self._head
+        position = 0
+        for i in range(self._level - 1, -1, -1):
+            while node.forward[i] is not None and node.forward[i].key <= key:
+                position += node.width[i]
+                node = node.forward[i]
+        if node is self._head or node.key != key:
+            return None
+        return position
+
+    def count_below(self, key: RankKey) -> int:
+        """Return how many keys sort strictly before a key, present or not"""
+        node = self._head
+        position = 0
+        for i in range(self._level - 1, -1, -1):
+            while node.forward[i] is not None and node.forward[i].key < key:
+                position += node.width[i]
+                node = node.forward[i]
+        return position
+
+    def slice(self, start: int, stop: int) -> List[RankKey]:
+        """Return the keys at 0-based positions [start, stop)"""
+        start = max(start, 0)
+        stop = min(stop, self._size)
+        if start >= stop:
+            return []
+
+        # Walk down to the node just before `start`, then follow level 0
+        node = self._head
+        position = 0
+        for i in range(self._level - 1, -1, -1):
+            while node.forward[i] is not None and position + node.width[i] <= start:
+                position += node.width[i]
+                node = node.forward[i]
+
+        keys = []
+        node = node.forward[0]
+        while node is not None and len(keys) < stop - start:
+            keys.append(node.key)
+            node = node.forward[0]
+        return keys
+
+class RankIndex:
+    """Per-category order-statistic index over ranked users (points > 0)"""
+
+    def __init__(self, categories: List[str]):
+        self._lock = threading.Lock()
+        self._categories = list(categories)
+        self._lists: Dict[str, IndexedSkipList] = {}
+        self._entries: Dict[str, Tuple[str, RankKey]] = {}
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._lists = {category: IndexedSkipList() for category in self._categories}
+            self._entries = {}
+
+    def load(self, rows):
+        """Rebuild the index from rows with github_username, category, points and pr_count.
+
+        The new lists are built aside and swapped in under the lock, so readers see either
+        the old index or the complete new one, never a partially loaded one.
+        """
+        entries: Dict[str, Tuple[str, RankKey]] = {}
+        for row in rows:
+            if row["points"] > 0 and row["category"] in self._categories:
+                entries[row["github_username"]] = (
+                    row["category"], rank_key(row["github_username"], row["points"], row["pr_count"]))
+
+        lists = {category: IndexedSkipList() for category in self._categories}
+        for category, key in entries.values():
+            lists[category].insert(key)
+
+        with self._lock:
+            self._lists = lists
+            self._entries = entries
+
+    def update(self, github_username: str, category: str, points: int, pr_count: int):
+        """Record a user's current totals, moving them between categories if needed"""
+        with self._lock:
+            previous = self._entries.pop(github_username, None)
+            if previous is not None:
+                self._lists[previous[0]].remove(previous[1])
+
+            # Only users with points appear on a leaderboard
+            if points > 0 and category in self._lists:
+                key = rank_key(github_username, points, pr_count)
+                self._lists[category].insert(key)
+                self._entries[github_username] = (category, key)
+
+    def position(self, github_username: str, category: str, points: int, pr_count: int) -> Optional[int]:
+        """Return the rank a user would hold with these totals, or None if they would be unranked"""
+        if points <= 0 or category not in self._lists:
+            return None
+        key = rank_key(github_username, points, pr_count)
+        with self._lock:
+            position = self._lists[category].count_below(key) + 1
+            # The user's current entry must not count as someone ahead of them
+            entry = self._entries.get(github_username)
+            if entry is not None and entry[0] == category and entry[1] < key:
+                position -= 1
+        return position
+
+    def rank(self, github_username: str) -> Optional[dict]:
+        """Return rank, total and percentile for a user, or None if they are unranked"""
+        with self._lock:
+            entry = self._entries.get(github_username)
+            if entry is None:
+                return None
+            category, key = entry
+            ranked = self._lists[category]
+            rank = ranked.rank(key)
+            total = len(ranked)
+
+        return {
+            "category": category,
+            "rank": rank,
+            "total": total,
+            # Share of ranked participants in the category this user is ahead of
+            "percentile": round(100.0 * (total - rank) / total, 2),
+        }
+
+    def around(self, github_username: str, n: int) -> Optional[dict]:
+        """Return the n entries above and below a user, or None if they are unranked"""
+        with self._lock:
+            entry = self._entries.get(github_username)
+            if entry is None:
+                return None
+            category, key = entry
+            ranked = self._lists[category]
+            rank = ranked.rank(key)
+            first_rank = max(rank - n, 1)
+            keys = ranked.slice(first_rank - 1, rank + n)
+
+        return {
+            "category": category,
+            "rank": rank,
+            "entries": [
+                {"github_username": username, "points": -points, "pr_count": -pr_count,
+                 "rank": first_rank + offset}
+                for offset, (points, pr_count, username) in enumerate(keys)
+            ],
+        }
@@ -0,0 +1,341 @@
+import argparse
+import json
+import os
+import time
+from typing import List
+
+from dotenv import load_dotenv
+
+# Before the local imports: they read their settings from the environment on import
+load_dotenv()
+
+from database import get_db_connection, init_database
+from label_rules import label_rules
+from leaderboard_cache import replace_leaderboard
+
+try:
+    import numpy
+except ImportError:
+    # Optional: aggregation falls back to plain Python loops without it
+    numpy = None
+
+REBUILD_BATCH_SIZE = int(os.getenv("REBUILD_BATCH_SIZE", "100000"))
+MAX_ROWID = 2 ** 63 - 1
+
+# Cross-repository closes are logged as "solving issue owner/repo#N"; the activity's repository
+# column is the PR's, so those rows keep their logged points when rescoring
+STREAM_ACTIVITIES = '''
+    SELECT u.id, {points} AS points, a.repository, a.pr_number
+    FROM activities a
+    JOIN users u ON u.github_username = a.github_username
+    {join}
+    WHERE a.type = 'pr_merged' AND a.id > ? AND a.id <= ?
+    ORDER BY a.id
+'''
+RESCORE_JOIN = '''
+    LEFT JOIN issue_rescore r ON r.repository = a.repository AND r.issue_number = a.issue_number
+        AND a.details NOT LIKE '%solving issue %/%'
+'''
+
+# Daily buckets for windowed leaderboards, keyed like the live path: the PR's category and merge day
+AGGREGATE_DAILY_SCORES = '''
+    INSERT INTO user_daily_shadow (category, day, github_username, points, pr_count, issues_solved)
+    SELECT a.category, COALESCE(date(p.merged_at), date(a.created_at)), a.github_username,
+           SUM({points}), COUNT(DISTINCT a.repository || '#' || a.pr_number), COUNT(*)
+    FROM activities a
+    JOIN users u ON u.github_username = a.github_username
+    LEFT JOIN pull_requests p ON p.pr_number = a.pr_number AND p.repository = a.repository
+    {join}
+    WHERE a.type = 'pr_merged' AND a.category IS NOT NULL AND a.id > ? AND a.id <= ?
+    GROUP BY 1, 2, 3
+    ON CONFLICT(category, day, github_username) DO UPDATE SET
+        points = points + excluded.points, pr_count = pr_count + excluded.pr_count,
+        issues_solved = issues_solved + excluded.issues_solved
+'''
+
+class Totals:
+    """Per-user points, PR and issue counters indexed by users.id"""
+
+    def __init__(self, size: int):
+        if numpy is not None:
+            self.points = numpy.zeros(size, dtype=numpy.int64)
+            self.pr_count = numpy.zeros(size, dtype=numpy.int64)
+            self.issues = numpy.zeros(size, dtype=numpy.int64)
+        else:
+            self.points = [0] * size
+            self.pr_count = [0] * size
+            self.issues = [0] * size
+        # (user id, repository, pr_number) of the last row seen, carried across batches
+        self.last_pr = None
+
+    def grow(self, size: int):
+        if size <= len(self.points):
+            return
+        if numpy is not None:
+            extra = size - len(self.points)
+            self.points = numpy.concatenate([self.points, numpy.zeros(extra, dtype=numpy.int64)])
+            self.pr_count = numpy.concatenate([self.pr_count, numpy.zeros(extra, dtype=numpy.int64)])
+            self.issues = numpy.concatenate([self.issues, numpy.zeros(extra, dtype=numpy.int64)])
+        else:
+            extra = [0] * (size - len(self.points))
+            self.points.extend(extra)
+            self.pr_count.extend(extra)
+            self.issues.extend(extra)
+
+    def add_batch(self, user_ids: list, points: list, repositories: list, pr_numbers: list):
+        """Fold one column-oriented batch of pr_merged activities into the counters.
+
+        Every activity is one solved issue. A PR's activities are written by a single
+        executemany, so they sit next to each other in id order: a row starts a new PR
+        whenever its (user, repository, pr_number) differs from the row before it.
+        """
+        if not user_ids:
+            return
+        self.grow(max(user_ids) + 1)
+        previous = self.last_pr
+        self.last_pr = (user_ids[-1], repositories[-1], pr_numbers[-1])
+
+        if numpy is not None:
+            users = numpy.asarray(user_ids, dtype=numpy.int64)
+            prs = numpy.asarray(pr_numbers, dtype=numpy.int64)
+            repos = numpy.asarray(repositories, dtype=object)
+            new_pr = numpy.empty(len(users), dtype=bool)
+            new_pr[0] = (user_ids[0], repositories[0], pr_numbers[0]) != previous
+            new_pr[1:] = (users[1:] != users[:-1]) | (prs[1:] != prs[:-1]) | (repos[1:] != repos[:-1])
+
+            size = len(self.points)
+            self.points += numpy.bincount(users, weights=numpy.asarray(points, dtype=numpy.int64),
+                                          minlength=size).astype(numpy.int64)
+            self.issues += numpy.bincount(users, minlength=size)
+            self.pr_count += numpy.bincount(users[new_pr], minlength=size)
+            return
+
+        for user_id, issue_points, repository, pr_number in zip(user_ids, points, repositories, pr_numbers):
+            self.points[user_id] += issue_points
+            self.issues[user_id] += 1
+            if (user_id, repository, pr_number) != previous:
+                self.pr_count[user_id] += 1
+                previous = (user_id, repository, pr_number)
+
+    def add_rollup(self, user_id: int, points: int, pr_count: int, issues: int):
+        self.grow(user_id + 1)
+        self.points[user_id] += points
+        self.pr_count[user_id] += pr_count
+        self.issues[user_id] += issues
+
+    def rows(self) -> List[tuple]:
+        """(user id, points, pr_count, issues_solved) for every user with activity"""
+        if numpy is not None:
+            active = numpy.flatnonzero(self.issues)
+            return list(zip(active.tolist(), self.points[active].tolist(),
+                            self.pr_count[active].tolist(), self.issues[active].tolist()))
+        return [(user_id, self.points[user_id], self.pr_count[user_id], self.issues[user_id])
+                for user_id in range(len(self.issues)) if self.issues[user_id]]
+
+def build_rescore_table(conn) -> int:
+    """Score every stored issue with the current label rules into a temporary lookup table"""
+    conn.execute('DROP TABLE IF EXISTS temp.issue_rescore')
+    conn.execute('''
+        CREATE TEMP TABLE issue_rescore (
+            repository TEXT NOT NULL,
+            issue_number INTEGER NOT NULL,
+            points INTEGER NOT NULL,
+            PRIMARY KEY (repository, issue_number)
+        )
+    ''')
+
+    cursor = conn.execute('SELECT repository, issue_number, labels FROM issues')
+    scored = 0
+    while True:
+        rows = cursor.fetchmany(REBUILD_BATCH_SIZE)
+        if not rows:
+            break
+        conn.executemany('INSERT INTO issue_rescore VALUES (?, ?, ?)', [
+            (row["repository"], row["issue_number"],
+             label_rules.classify([{"name": name} for name in json.loads(row["labels"] or "[]")],
+                                  row["repository"])[0])
+            for row in rows
+        ])
+        scored += len(rows)
+    return scored
+
+def aggregate_activities(conn, totals: Totals, after_id: int, up_to_id: int, rescore: bool) -> int:
+    """Stream pr_merged activities in (after_id, up_to_id] into totals; returns rows read"""
+    query = STREAM_ACTIVITIES.format(points="COALESCE(r.points, a.points, 0)" if rescore else "COALESCE(a.points, 0)",
+                                     join=RESCORE_JOIN if rescore else "")
+    cursor = conn.execute(query, (after_id, up_to_id))
+    read = 0
+    while True:
+        rows = cursor.fetchmany(REBUILD_BATCH_SIZE)
+        if not rows:
+            break
+        # Transpose to columns once per batch; all arithmetic happens on whole columns
+        user_ids, points, repositories, pr_numbers = (list(column) for column in zip(*rows))
+        totals.add_batch(user_ids, points, repositories, pr_numbers)
+        read += len(rows)
+    return read
+
+def aggregate_rollups(conn, totals: Totals):
+    """Add pr_merged history that compaction folded into activity_daily"""
+    cursor = conn.execute('''
+        SELECT u.id, SUM(d.points), SUM(d.pr_count), SUM(d.activity_count)
+        FROM activity_daily d
+        JOIN users u ON u.github_username = d.github_username
+        WHERE d.type = 'pr_merged'
+        GROUP BY u.id
+    ''')
+    for user_id, points, pr_count, issues in cursor.fetchall():
+        totals.add_rollup(user_id, points, pr_count, issues)
+
+def create_daily_shadow(conn):
+    conn.execute('DROP TABLE IF EXISTS temp.user_daily_shadow')
+    conn.execute('''
+        CREATE TEMP TABLE user_daily_shadow (
+            category TEXT NOT NULL,
+            day TEXT NOT NULL,
+            github_username TEXT NOT NULL,
+            points INTEGER NOT NULL,
+            pr_count INTEGER NOT NULL,
+            issues_solved INTEGER NOT NULL,
+            PRIMARY KEY (category, day, github_username)
+        ) WITHOUT ROWID
+    ''')
+
+def aggregate_daily_scores(conn, after_id: int, up_to_id: int, rescore: bool):
+    """Fold pr_merged activities in (after_id, up_to_id] into the daily bucket shadow table"""
+    conn.execute(AGGREGATE_DAILY_SCORES.format(
+        points="COALESCE(r.points, a.points, 0)" if rescore else "COALESCE(a.points, 0)",
+        join=RESCORE_JOIN if rescore else ""), (after_id, up_to_id))
+
+def aggregate_daily_rollups(conn):
+    """Add the daily pr_merged history that compaction folded into activity_daily"""
+    conn.execute('''
+        INSERT INTO user_daily_shadow (category, day, github_username, points, pr_count, issues_solved)
+        SELECT d.category, d.day, d.github_username, d.points, d.pr_count, d.activity_count
+        FROM activity_daily d
+        JOIN users u ON u.github_username = d.github_username
+        WHERE d.type = 'pr_merged' AND d.category != ''
+        ON CONFLICT(category, day, github_username) DO UPDATE SET
+            points = points + excluded.points, pr_count = pr_count + excluded.pr_count,
+            issues_solved = issues_solved + excluded.issues_solved
+    ''')
+
+def rebuild_user_totals(rescore: bool = False, check_only: bool = False) -> dict:
+    """Recompute users.points, pr_count and issues_solved from the activity log, on top of the
+    base totals granted at registration.
+
+    The log is aggregated from a read snapshot without holding the write lock; the short
+    swap transaction then folds in anything logged since, updates users from a shadow
+    table in one statement pair and replaces user_daily_scores and the leaderboard snapshot,
+    so windowed and cached leaderboards agree with the totals. Returns stats plus the
+    usernames whose totals changed.
+    """
+    started = time.perf_counter()
+    conn = get_db_connection()
+    try:
+        max_user_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM users').fetchone()[0]
+        snapshot_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM activities').fetchone()[0]
+
+        rescored_issues = build_rescore_table(conn) if rescore else 0
+        if rescore:
+            conn.commit()
+
+        totals = Totals(max_user_id + 1)
+        read = aggregate_activities(conn, totals, 0, snapshot_id, rescore)
+        aggregate_rollups(conn, totals)
+        create_daily_shadow(conn)
+        aggregate_daily_scores(conn, 0, snapshot_id, rescore)
+        aggregate_daily_rollups(conn)
+        # Only the temp table was written; release the read snapshot before taking the write lock
+        conn.commit()
+        aggregated_at = time.perf_counter()
+
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Activities committed while the snapshot was being aggregated
+            read += aggregate_activities(conn, totals, snapshot_id, MAX_ROWID, rescore)
+            aggregate_daily_scores(conn, snapshot_id, MAX_ROWID, rescore)
+
+            conn.execute('DROP TABLE IF EXISTS temp.user_totals_shadow')
+            conn.execute('''
+                CREATE TEMP TABLE user_totals_shadow (
+                    user_id INTEGER PRIMARY KEY,
+                    points INTEGER NOT NULL,
+                    pr_count INTEGER NOT NULL,
+                    issues_solved INTEGER NOT NULL
+                )
+            ''')
+            conn.executemany('INSERT INTO user_totals_shadow VALUES (?, ?, ?, ?)', totals.rows())
+
+            # Totals granted at registration are not in the log and stay on top of it
+            cursor = conn.execute('''
+                SELECT u.github_username, u.points AS old_points, u.base_points + COALESCE(s.points, 0) AS points
+                FROM users u
+                LEFT JOIN user_totals_shadow s ON s.user_id = u.id
+                WHERE u.points IS NOT u.base_points + COALESCE(s.points, 0)
+                   OR u.pr_count IS NOT u.base_pr_count + COALESCE(s.pr_count, 0)
+                   OR u.issues_solved IS NOT u.base_issues_solved + COALESCE(s.issues_solved, 0)
+            ''')
+            changed = [dict(row) for row in cursor.fetchall()]
+
+            if check_only or not changed:
+                conn.rollback()
+            else:
+                conn.execute('''
+                    UPDATE users SET points = base_points + s.points, pr_count = base_pr_count + s.pr_count,
+                        issues_solved = base_issues_solved + s.issues_solved, updated_at = CURRENT_TIMESTAMP
+                    FROM user_totals_shadow s
+                    WHERE s.user_id = users.id
+                      AND (users.points IS NOT base_points + s.points
+                           OR users.pr_count IS NOT base_pr_count + s.pr_count
+                           OR users.issues_solved IS NOT base_issues_solved + s.issues_solved)
+                ''')
+                # Users with no scoring activity left at all
+                conn.execute('''
+                    UPDATE users SET points = base_points, pr_count = base_pr_count,
+                        issues_solved = base_issues_solved, updated_at = CURRENT_TIMESTAMP
+                    WHERE id NOT IN (SELECT user_id FROM user_totals_shadow)
+                      AND (points IS NOT base_points OR pr_count IS NOT base_pr_count
+                           OR issues_solved IS NOT base_issues_solved)
+                ''')
+                conn.execute('DELETE FROM user_daily_scores')
+                conn.execute('''
+                    INSERT INTO user_daily_scores (category, day, github_username, points, pr_count, issues_solved)
+                    SELECT category, day, github_username, points, pr_count, issues_solved FROM user_daily_shadow
+                ''')
+                # A running API keeps serving the snapshot, so it changes together with users
+                replace_leaderboard(conn.cursor())
+                conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.execute('DROP TABLE IF EXISTS temp.user_totals_shadow')
+            conn.execute('DROP TABLE IF EXISTS temp.user_daily_shadow')
+            conn.execute('DROP TABLE IF EXISTS temp.issue_rescore')
+    finally:
+        conn.close()
+
+    return {
+        "activities": read,
+        "rescored_issues": rescored_issues,
+        "users_changed": len(changed),
+        "applied": bool(changed) and not check_only,
+        "changes": changed,
+        "aggregate_seconds": round(aggregated_at - started, 3),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute user totals from the pr_merged activity log")
+    parser.add_argument("--rescore", action="store_true", help="re-score logged issues with the current label rules")
+    parser.add_argument("--check", action="store_true", help="report drifted users without changing anything")
+    args = parser.parse_args()
+
+    init_database()
+    label_rules.load()
+    result = rebuild_user_totals(rescore=args.rescore, check_only=args.check)
+    print(json.dumps(result, indent=2))
+    if result["applied"]:
+        print("A running API reloads its rank index within LEADERBOARD_RELOAD_INTERVAL seconds; "
+              "POST /api/v1/admin/rebuild-totals rebuilds and reloads in one step")
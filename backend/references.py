@@ -0,0 +1,47 @@
+import os
+import re
+from typing import List, Optional
+
+# "Closes #12", "fixes owner/repo#34", "Resolves: #5"; every match counts, not just the first
+CLOSING_REFERENCE = re.compile(
+    r'(?:close[sd]?|fix(?:e[sd])?|resolve[sd]?):?\s+([\w.-]+/[\w.-]+)?#(\d+)', re.IGNORECASE
+)
+
+# Most issues one PR can be credited for; also bounds the batched GitHub lookup behind a merge
+MAX_CLOSING_REFERENCES = int(os.getenv("MAX_CLOSING_REFERENCES", "10"))
+
+# Repositories outside the PR's own owner that cross-repo references may point at (comma-separated owner/repo)
+TRACKED_REPOSITORIES = {
+    repository.strip().lower(): repository.strip()
+    for repository in os.getenv("TRACKED_REPOSITORIES", "").split(",") if repository.strip()
+}
+
+def tracked_repository(repository: str, repo_name: str) -> Optional[str]:
+    """Canonical name of a cross-repo reference target, or None if it is not one of ours.
+
+    Only repositories of the PR's own owner or on the allowlist count, so a PR cannot
+    collect points by "fixing" issues of arbitrary public repositories.
+    """
+    if repository.lower() in TRACKED_REPOSITORIES:
+        return TRACKED_REPOSITORIES[repository.lower()]
+    if repository.partition("/")[0].lower() == repo_name.partition("/")[0].lower():
+        return repository
+    return None
+
+def parse_closing_references(body: Optional[str], repo_name: str,
+                             limit: int = MAX_CLOSING_REFERENCES) -> List[tuple]:
+    """Unique (repository, issue_number) pairs a PR body closes, in order of appearance, at most `limit`"""
+    references = []
+    for repository, number in CLOSING_REFERENCE.findall(body or ""):
+        if not repository or repository.lower() == repo_name.lower():
+            repository = repo_name
+        else:
+            repository = tracked_repository(repository, repo_name)
+            if repository is None:
+                continue
+        reference = (repository, int(number))
+        if reference not in references:
+            references.append(reference)
+            if len(references) >= limit:
+                break
+    return references
@@ -0,0 +1,177 @@
+import asyncio
+import gzip
+import json
+import threading
+from collections import OrderedDict
+from functools import wraps
+from typing import Awaitable, Callable, Dict, Optional
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    # Optional: falls back to the standard json module
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    # Optional: only gzip variants are produced without it
+    brotli = None
+
+# Bodies smaller than this are not worth a compressed variant
+MIN_COMPRESS_SIZE = 512
+
+def dumps(payload) -> bytes:
+    """Serialize to compact JSON bytes, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(",", ":")).encode("utf-8")
+
+def encoded_etag(etag: str, coding: Optional[str]) -> str:
+    """Strong ETags must differ per content-coding, so tag the coding onto the quoted value"""
+    if coding is None:
+        return etag
+    return f'{etag[:-1]}-{coding}"'
+
+def strip_coding(etag: str) -> str:
+    """Inverse of encoded_etag, for comparing If-None-Match against the base tag"""
+    for coding in ("br", "gzip"):
+        suffix = f'-{coding}"'
+        if etag.endswith(suffix):
+            return etag[:-len(suffix)] + '"'
+    return etag
+
+def parse_accept_encoding(header: Optional[str]) -> Dict[str, float]:
+    """Map each coding in an Accept-Encoding header to its q-value"""
+    codings = {}
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        codings[name.strip().lower()] = quality
+    return codings
+
+class EncodedBody:
+    """A response body serialized once, with its compressed variants"""
+
+    __slots__ = ("identity", "variants")
+
+    def __init__(self, payload):
+        self.identity = dumps(payload)
+        self.variants: Dict[str, bytes] = {}
+        if len(self.identity) >= MIN_COMPRESS_SIZE:
+            if brotli is not None:
+                self.variants["br"] = brotli.compress(self.identity, quality=5)
+            self.variants["gzip"] = gzip.compress(self.identity, compresslevel=6, mtime=0)
+
+    @property
+    def size(self) -> int:
+        return len(self.identity) + sum(len(variant) for variant in self.variants.values())
+
+    def choose(self, accept_encoding: Optional[str]):
+        """Pick the best encoding the client accepts: (coding or None, body)"""
+        codings = parse_accept_encoding(accept_encoding)
+        wildcard = codings.get("*", 0.0)
+        best = None
+        best_quality = 0.0
+        # Server preference order breaks ties between equal q-values
+        for coding in ("br", "gzip"):
+            if coding not in self.variants:
+                continue
+            quality = codings.get(coding, wildcard)
+            if quality > best_quality:
+                best, best_quality = coding, quality
+        if best is None:
+            return None, self.identity
+        return best, self.variants[best]
+
+    def to_response(self, accept_encoding: Optional[str], headers: Optional[dict] = None) -> Response:
+        coding, body = self.choose(accept_encoding)
+        response_headers = dict(headers or {})
+        response_headers["Vary"] = "Accept-Encoding"
+        if coding is not None:
+            response_headers["Content-Encoding"] = coding
+            if "ETag" in response_headers:
+                response_headers["ETag"] = encoded_etag(response_headers["ETag"], coding)
+        return Response(content=body, media_type="application/json", headers=response_headers)
+
+def encoded(build: Callable) -> Callable:
+    """Wrap a payload builder so serialization and compression run wherever the builder does"""
+    @wraps(build)
+    def encode(*args, **kwargs) -> EncodedBody:
+        return EncodedBody(build(*args, **kwargs))
+    return encode
+
+class ResponseCache:
+    """Encoded response bodies keyed by ETag, so a new version is simply a new key.
+
+    Bounded by the total size of the encoded bodies rather than by entry count, evicting the
+    least recently used first: superseded versions stop being read and age out. Concurrent
+    misses on one key share a single build.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, EncodedBody]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # Builds in progress; only touched from the event loop
+        self._building: Dict[str, asyncio.Future] = {}
+
+    def get(self, key: str) -> Optional[EncodedBody]:
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+            return body
+
+    def put(self, key: str, body: EncodedBody) -> EncodedBody:
+        size = body.size
+        if size > self.max_bytes:
+            # Larger than the whole budget: serve it, but do not flush everything else for it
+            return body
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.size
+            self._entries[key] = body
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+        return body
+
+    async def get_or_build(self, key: str, build: Callable[[], Awaitable[EncodedBody]]) -> EncodedBody:
+        """Return the cached body for key, or await build() once however many requests miss together"""
+        body = self.get(key)
+        if body is not None:
+            return body
+
+        pending = self._building.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self._build(key, build))
+            self._building[key] = pending
+            pending.add_done_callback(lambda _: self._building.pop(key, None))
+        # Shielded so a client that disconnects does not cancel a build others are waiting on
+        return await asyncio.shield(pending)
+
+    async def _build(self, key: str, build: Callable[[], Awaitable[EncodedBody]]) -> EncodedBody:
+        return self.put(key, await build())
+
+    @property
+    def size(self) -> int:
+        return self._bytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
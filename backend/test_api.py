@@ -6,11 +6,35 @@ This script tests the various endpoints and simulates GitHub webhook events
 
 import requests
 import json
+import random
+import sqlite3
 import time
+import uuid
 from datetime import datetime
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+# Same settings as the API, for the checks that read the database directly
+load_dotenv()
+
+from leaderboard_cache import CATEGORIES, LEADERBOARD_SNAPSHOT_SIZE
+from rank_index import IndexedSkipList, rank_key
+from rebuild import rebuild_user_totals
 
 # Configuration
 BASE_URL = "http://localhost:8000/api/v1"
+DB_PATH = Path(__file__).parent / "leaderboard.db"
+
+# Registered with points of its own, which no pr_merged activity backs
+BASE_POINTS_USER = {
+    "github_username": "dana_registered",
+    "full_name": "Dana Lee",
+    "category": "aiml",
+    "points": 20,
+    "pr_count": 1,
+    "issues_solved": 2
+}
 TEST_USERS = [
     {
         "github_username": "alice_fullstack",
@@ -86,6 +110,114 @@ def simulate_github_webhook(event_type, payload):
     
     return None
 
+def check(condition, description):
+    """Report one consistency check"""
+    print(f"{'✅' if condition else '❌'} {description}")
+    return condition
+
+def ranked_users(category):
+    """Every ranked user of a category in leaderboard order, straight from SQL"""
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        return [row[0] for row in conn.execute('''
+            SELECT github_username FROM users
+            WHERE category = ? AND points > 0
+            ORDER BY points DESC, pr_count DESC, github_username
+        ''', (category,))]
+    finally:
+        conn.close()
+
+def test_skip_list():
+    """The rank index's skip list must agree with a plain sort through inserts and removals"""
+    rng = random.Random(7)
+    keys = {rank_key(f"user{i}", rng.randint(0, 50), rng.randint(0, 5)) for i in range(2000)}
+    ranked = IndexedSkipList()
+    for key in keys:
+        ranked.insert(key)
+    removed = set(rng.sample(sorted(keys), 500))
+    for key in removed:
+        ranked.remove(key)
+    expected = sorted(keys - removed)
+    
+    ok = check(ranked.slice(0, len(ranked)) == expected, "Skip list holds its keys in sorted order")
+    ok &= check(all(ranked.rank(key) == position for position, key in enumerate(expected, start=1)),
+                "Skip list ranks match sorted positions")
+    probe = rank_key("user_missing", 25, 3)
+    ok &= check(ranked.count_below(probe) == sum(1 for key in expected if key < probe),
+                "Skip list counts keys below an absent key")
+    return ok
+
+def test_rank_index_matches_sql():
+    """Paged leaderboards and the rank endpoints must follow the SQL ranking"""
+    ok = True
+    for category in CATEGORIES:
+        expected = ranked_users(category)
+        
+        paged = []
+        cursor = None
+        while True:
+            url = f"{BASE_URL}/leaderboard/{category}?limit=200" + (f"&cursor={cursor}" if cursor else "")
+            page = requests.get(url).json()
+            paged.extend(entry["github_username"] for entry in page["leaderboard"])
+            cursor = page.get("next_cursor")
+            if not cursor:
+                break
+        ok &= check(paged == expected, f"{category}: cursor pages walk the SQL order ({len(expected)} users)")
+        
+        sample = expected[:25] + expected[-25:]
+        ranks = {name: requests.get(f"{BASE_URL}/user/{name}/rank").json()["rank"] for name in sample}
+        ok &= check(all(ranks[name] and ranks[name]["rank"] == expected.index(name) + 1 for name in sample),
+                    f"{category}: rank index agrees with SQL positions")
+    
+    response = requests.get(f"{BASE_URL}/leaderboard/{CATEGORIES[0]}?limit=10&cursor=not-a-cursor")
+    ok &= check(response.status_code == 400, "Malformed cursor is rejected with 400")
+    return ok
+
+def test_snapshot_matches_users():
+    """leaderboard_cache must hold exactly the top of each category as users ranks it"""
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        ok = True
+        for category in CATEGORIES:
+            expected = ranked_users(category)[:LEADERBOARD_SNAPSHOT_SIZE]
+            snapshot = conn.execute('''
+                SELECT rank, github_username FROM leaderboard_cache WHERE category = ? ORDER BY rank
+            ''', (category,)).fetchall()
+            ok &= check([rank for rank, _ in snapshot] == list(range(1, len(snapshot) + 1)),
+                        f"{category}: snapshot positions are contiguous")
+            ok &= check([name for _, name in snapshot] == expected, f"{category}: snapshot matches users")
+            
+            served = requests.get(f"{BASE_URL}/leaderboard/{category}").json()["leaderboard"]
+            ok &= check([entry["github_username"] for entry in served] == expected,
+                        f"{category}: /leaderboard serves the snapshot")
+        return ok
+    finally:
+        conn.close()
+
+def test_rebuild_is_noop():
+    """Rebuilding totals from the activity log must find nothing to change on consistent data"""
+    result = rebuild_user_totals(check_only=True)
+    return check(result["users_changed"] == 0,
+                 f"Rebuild check reports no drift ({result['users_changed']} users changed: {result['changes'][:5]})")
+
+def test_conditional_get():
+    """An unchanged leaderboard answers If-None-Match with 304"""
+    url = f"{BASE_URL}/leaderboard/{CATEGORIES[0]}"
+    etag = requests.get(url).headers.get("etag")
+    response = requests.get(url, headers={"If-None-Match": etag or ""})
+    return check(etag is not None and response.status_code == 304, "Leaderboard revalidates with 304")
+
+def test_webhook_dedupe():
+    """A redelivered webhook is recognised by its delivery id"""
+    url = f"{BASE_URL}/webhook/github"
+    headers = {"X-GitHub-Event": "ping", "X-GitHub-Delivery": str(uuid.uuid4())}
+    first = requests.post(url, json={"zen": "test"}, headers=headers)
+    # Queue mode remembers a delivery once a worker has processed it
+    time.sleep(1.5)
+    second = requests.post(url, json={"zen": "test"}, headers=headers)
+    return check(first.status_code in (200, 202) and second.json().get("status") == "duplicate",
+                 "Redelivered webhook is answered as a duplicate")
+
 def main():
     print("🚀 Starting Leadership Board API Tests")
     print("=" * 50)
@@ -98,17 +230,21 @@ def main():
     print("\n2. Registering Test Users")
     for user in TEST_USERS:
         test_api_endpoint("POST", "/register", user, 200)
+    test_api_endpoint("POST", "/register", BASE_POINTS_USER, 200)
     
     # Test 3: Test leaderboard endpoints
     print("\n3. Testing Leaderboard Endpoints")
     test_api_endpoint("GET", "/leaderboard")
     test_api_endpoint("GET", "/leaderboard/fullstack")
     test_api_endpoint("GET", "/leaderboard/aiml")
+    test_api_endpoint("GET", "/leaderboard/fullstack?limit=2")
     
     # Test 4: Test user endpoints
     print("\n4. Testing User Endpoints")
     test_api_endpoint("GET", "/user/alice_fullstack")
     test_api_endpoint("GET", "/user/nonexistent_user", expected_status=404)
+    test_api_endpoint("GET", "/user/alice_fullstack/rank")
+    test_api_endpoint("GET", "/user/alice_fullstack/around?n=3")
     
     # Test 5: Test activities endpoint
     print("\n5. Testing Activities Endpoint")
@@ -210,11 +346,26 @@ def main():
         for activity in activities_result.get('activities', [])[:5]:
             print(f"  • {activity['type']} by {activity.get('github_username', 'system')} - {activity.get('details', 'No details')}")
     
+    # Test 8: Consistency between the rank index, snapshots, SQL and the activity log
+    print("\n8. Consistency Checks")
+    time.sleep(1)  # Let the activity writer flush
+    results = [
+        test_skip_list(),
+        test_rank_index_matches_sql(),
+        test_snapshot_matches_users(),
+        test_rebuild_is_noop(),
+        test_conditional_get(),
+        test_webhook_dedupe(),
+    ]
+    if not all(results):
+        print("\n❌ Some consistency checks failed")
+    
     print("\n✅ All tests completed!")
     print("\n💡 Tips:")
     print("  - Check the frontend at http://localhost:3000")
     print("  - View the database at backend/leaderboard.db")
     print("  - Monitor API logs for webhook processing")
+    return all(results)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    raise SystemExit(0 if main() else 1)
\ No newline at end of file
@@ -0,0 +1,46 @@
+import hashlib
+import threading
+import time
+from typing import Dict, Tuple
+
+class VersionRegistry:
+    """Monotonic per-scope version counters used to derive ETags and Last-Modified.
+
+    Versions live in process memory, so the boot id is mixed into every tag:
+    a restarted (or different) worker never reuses a tag for different data.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._boot_id = f"{time.time_ns():x}"
+        self._boot_time = time.time()
+        self._versions: Dict[str, Tuple[int, float]] = {}
+
+    def bump(self, *scopes: str):
+        """Record a committed change to each scope"""
+        now = time.time()
+        with self._lock:
+            for scope in scopes:
+                version, _ = self._versions.get(scope, (0, self._boot_time))
+                self._versions[scope] = (version + 1, now)
+
+    def reset(self):
+        """Invalidate every tag at once, for changes committed outside this process"""
+        with self._lock:
+            # A new boot id never reuses an old tag, even as the counters restart from 0
+            self._boot_id = f"{time.time_ns():x}"
+            self._boot_time = time.time()
+            self._versions = {}
+
+    def get(self, scope: str) -> Tuple[int, float]:
+        return self._versions.get(scope, (0, self._boot_time))
+
+    def etag(self, *scopes: str, variant: str = "") -> str:
+        """Strong ETag for a response built from these scopes (variant covers query parameters)"""
+        parts = [self._boot_id, variant]
+        parts.extend(f"{scope}={self.get(scope)[0]}" for scope in scopes)
+        digest = hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()[:20]
+        return f'"{digest}"'
+
+    def last_modified(self, *scopes: str) -> float:
+        return max(self.get(scope)[1] for scope in scopes)
@@ -0,0 +1,200 @@
+import asyncio
+import json
+from typing import Awaitable, Callable, List, Optional
+
+from db_async import db
+
+# Dispatch callback: (event_type, parsed payload) -> awaitable
+Dispatcher = Callable[[Optional[str], dict], Awaitable[None]]
+
+# Called with the GitHub delivery ids of each batch of successfully processed deliveries
+DoneCallback = Callable[[List[str]], None]
+
+def enqueue_delivery(conn, delivery_id: Optional[str], event_type: Optional[str], body: bytes) -> Optional[int]:
+    """Append a raw webhook delivery to the queue and return its id, or None if it is already queued.
+
+    A redelivery of one that was parked as failed is queued again with fresh attempts,
+    the same way inline processing lets a failed delivery be redelivered.
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO webhook_queue (delivery_id, event_type, payload)
+        VALUES (?, ?, ?)
+        ON CONFLICT(delivery_id) WHERE delivery_id IS NOT NULL DO UPDATE SET
+            event_type = excluded.event_type, payload = excluded.payload, status = 'pending',
+            attempts = 0, last_error = NULL, received_at = CURRENT_TIMESTAMP,
+            started_at = NULL, processed_at = NULL, retry_at = NULL
+        WHERE webhook_queue.status = 'failed'
+        RETURNING id
+    ''', (delivery_id, event_type, body))
+    row = cursor.fetchone()
+    return row[0] if row is not None else None
+
+def claim_batch(conn, batch_size: int) -> List[dict]:
+    """Atomically mark up to batch_size pending deliveries as processing and return them"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        UPDATE webhook_queue
+        SET status = 'processing', attempts = attempts + 1, started_at = CURRENT_TIMESTAMP
+        WHERE id IN (
+            SELECT id FROM webhook_queue
+            WHERE status = 'pending' AND (retry_at IS NULL OR retry_at <= CURRENT_TIMESTAMP)
+            ORDER BY id LIMIT ?
+        )
+        RETURNING id, delivery_id, event_type, payload, attempts
+    ''', (batch_size,))
+    rows = [dict(row) for row in cursor.fetchall()]
+    conn.commit()
+    # RETURNING does not guarantee order; keep deliveries in arrival order
+    return sorted(rows, key=lambda row: row["id"])
+
+def mark_done(conn, delivery_ids: List[int]):
+    """Record successfully processed deliveries"""
+    if not delivery_ids:
+        return
+    conn.executemany('''
+        UPDATE webhook_queue SET status = 'done', processed_at = CURRENT_TIMESTAMP, last_error = NULL
+        WHERE id = ?
+    ''', [(delivery_id,) for delivery_id in delivery_ids])
+    conn.commit()
+
+def mark_failed(conn, delivery_id: int, error: str, attempts: int, max_attempts: int):
+    """Put a failed delivery back in the queue with backoff, or park it once it runs out of attempts"""
+    status = 'failed' if attempts >= max_attempts else 'pending'
+    backoff = f'+{2 ** attempts} seconds'
+    conn.execute('''
+        UPDATE webhook_queue
+        SET status = ?, last_error = ?, processed_at = CURRENT_TIMESTAMP, retry_at = datetime('now', ?)
+        WHERE id = ?
+    ''', (status, error[:1000], backoff, delivery_id))
+    conn.commit()
+
+def requeue_in_flight(conn) -> int:
+    """Return deliveries left in 'processing' by a previous process to the queue"""
+    cursor = conn.cursor()
+    cursor.execute("UPDATE webhook_queue SET status = 'pending' WHERE status = 'processing'")
+    conn.commit()
+    return cursor.rowcount
+
+def purge_processed(conn, retention_seconds: int) -> int:
+    """Delete processed deliveries older than the retention window"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        DELETE FROM webhook_queue
+        WHERE status = 'done' AND processed_at < datetime('now', ?)
+    ''', (f'-{int(retention_seconds)} seconds',))
+    conn.commit()
+    return cursor.rowcount
+
+def queue_stats(conn) -> dict:
+    """Queue depth per status plus the age of the oldest pending delivery"""
+    cursor = conn.cursor()
+    cursor.execute('SELECT status, COUNT(*) AS count FROM webhook_queue GROUP BY status')
+    depth = {"pending": 0, "processing": 0, "done": 0, "failed": 0}
+    depth.update({row["status"]: row["count"] for row in cursor.fetchall()})
+
+    cursor.execute('''
+        SELECT (julianday('now') - julianday(MIN(received_at))) * 86400 AS lag
+        FROM webhook_queue WHERE status = 'pending'
+    ''')
+    lag = cursor.fetchone()["lag"]
+
+    cursor.execute('''
+        SELECT AVG((julianday(processed_at) - julianday(received_at)) * 86400) AS latency
+        FROM (
+            SELECT received_at, processed_at FROM webhook_queue
+            WHERE status = 'done' ORDER BY id DESC LIMIT 100
+        )
+    ''')
+    latency = cursor.fetchone()["latency"]
+
+    return {
+        "depth": depth,
+        "oldest_pending_seconds": round(lag, 3) if lag is not None else 0.0,
+        "recent_processing_seconds": round(latency, 3) if latency is not None else None,
+    }
+
+class WebhookWorkers:
+    """Background asyncio workers that drain the webhook queue in batches"""
+
+    def __init__(self, dispatch: Dispatcher, workers: int = 1, batch_size: int = 20,
+                 poll_interval: float = 1.0, max_attempts: int = 5, retention_seconds: int = 86400,
+                 on_done: Optional[DoneCallback] = None):
+        self._dispatch = dispatch
+        self._on_done = on_done
+        self._worker_count = workers
+        self._batch_size = batch_size
+        self._poll_interval = poll_interval
+        self._max_attempts = max_attempts
+        self._retention_seconds = retention_seconds
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = False
+
+    async def start(self):
+        requeued = await db.write(requeue_in_flight)
+        if requeued:
+            print(f"Requeued {requeued} webhook deliveries left in flight")
+
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self._worker_count)]
+
+    def notify(self):
+        """Wake idle workers after an enqueue instead of waiting for the next poll"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def stop(self, timeout: float = 10.0):
+        self._stopping = True
+        self.notify()
+        if not self._tasks:
+            return
+        _, pending = await asyncio.wait(self._tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        self._tasks = []
+
+    async def _run(self):
+        batches = 0
+        while not self._stopping:
+            batch = await db.write(claim_batch, self._batch_size)
+
+            if not batch:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self._poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._process_batch(batch)
+
+            batches += 1
+            if batches % 100 == 0:
+                await db.write(purge_processed, self._retention_seconds)
+
+    async def _process_batch(self, batch: List[dict]):
+        done = []
+        for delivery in batch:
+            try:
+                payload = json.loads(delivery["payload"])
+            except ValueError as exc:
+                # A body that is not JSON will never succeed, so park it immediately
+                await self._fail(delivery, exc, self._max_attempts)
+                continue
+
+            try:
+                await self._dispatch(delivery["event_type"], payload)
+            except Exception as exc:
+                await self._fail(delivery, exc, delivery["attempts"])
+            else:
+                done.append(delivery)
+
+        await db.write(mark_done, [delivery["id"] for delivery in done])
+        if self._on_done is not None:
+            self._on_done([delivery["delivery_id"] for delivery in done if delivery["delivery_id"]])
+
+    async def _fail(self, delivery: dict, exc: Exception, attempts: int):
+        await db.write(mark_failed, delivery["id"], repr(exc), attempts, self._max_attempts)
+        print(f"Webhook delivery {delivery['id']} failed: {exc!r}")